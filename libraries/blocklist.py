@@ -0,0 +1,255 @@
+'''
+Blocklist library
+Offline index of known (e.g. breached) passwords. The index is a sorted array of fixed-width 64-bit
+hashes which is memory-mapped rather than loaded, so membership tests cost a handful of page reads
+and no resident copy of the list is needed.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, mmap, struct, hashlib
+from itertools import islice
+from external_sort import external_sort_uint64, default_memory_limit
+from file_helper import replace_file
+
+_blocklist_magic = b'PPBLOCK1'
+_header = struct.Struct('>8sQ')		# Magic, number of hashes.
+_hash = struct.Struct('>Q')
+_write_block = 8192					# Hashes per write when building an index.
+
+def password_hash(password):
+	'''
+	The 64-bit hash used to index a password. Unicode strings are encoded as UTF-8.
+
+	@param password The password.
+	@type password (str, unicode)
+
+	@return Returns the hash as an integer.
+	'''
+	if not isinstance(password, bytes):
+		password = password.encode('utf-8')
+
+	return _hash.unpack(hashlib.sha1(password).digest()[:_hash.size])[0]
+
+def build_blocklist(wordlist_path, output_path, memory_limit=default_memory_limit, temp_dir=None):
+	'''
+	Build a blocklist index from a wordlist with one password per line. The hashes are sorted on
+	disk as packed 64-bit integers, so the wordlist can be much larger than memory. The index is
+	written to a temporary file and renamed into place once complete, so a Blocklist opened while
+	it is being rebuilt sees either the old index or the new one.
+
+	@param wordlist_path Path to the wordlist. Lines are used as-is, without decoding, so the
+						  wordlist should be UTF-8 encoded.
+	@type wordlist_path str
+
+	@param output_path Path to write the index to.
+	@type output_path str
+
+	@param memory_limit Approximate memory ceiling for the sort, in bytes. [Default: 64 MiB]
+	@type memory_limit int
+
+	@param temp_dir Directory in which to create the temporary sort files. [Default: None]
+	@type temp_dir str
+
+	@return Returns the number of distinct hashes in the index.
+	'''
+	def hashes():
+		sha1 = hashlib.sha1
+		unpack = _hash.unpack
+		with open(wordlist_path, 'rb') as wordlist:
+			for line in wordlist:
+				password = line.rstrip(b'\r\n')
+				if password:
+					yield unpack(sha1(password).digest()[:_hash.size])[0]
+
+	def distinct(values):
+		last_value = None
+		for value in values:
+			if value != last_value:
+				yield value
+				last_value = value
+
+	if os.path.dirname(output_path) and not os.path.exists(os.path.dirname(output_path)):
+		os.makedirs(os.path.dirname(output_path))
+
+	tmp_path = output_path + '.tmp'
+	count = 0
+	try:
+		with open(tmp_path, 'wb') as index_file:
+			index_file.write(_header.pack(_blocklist_magic, 0))
+
+			sorted_hashes = distinct(external_sort_uint64(hashes(), memory_limit=memory_limit,
+															temp_dir=temp_dir))
+			while True:
+				block = list(islice(sorted_hashes, _write_block))
+				if not block:
+					break
+
+				index_file.write(struct.pack('>{}Q'.format(len(block)), *block))
+				count += len(block)
+
+			# Now that we know how many there are, fill in the header.
+			index_file.seek(0)
+			index_file.write(_header.pack(_blocklist_magic, count))
+
+			index_file.flush()
+			os.fsync(index_file.fileno())
+
+		replace_file(tmp_path, output_path)
+	except:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+		raise
+
+	return count
+
+class Blocklist:
+	'''
+	Read-only, memory-mapped access to a blocklist index written by build_blocklist().
+	'''
+
+	def __init__(self, file_path):
+		'''
+		Open a blocklist index.
+
+		@param file_path The path of the index.
+		@type file_path str
+
+		@throws InvalidBlocklistFile Raised if the file is not a valid blocklist index.
+		'''
+		self.file_path = file_path
+		self.rejected = 0				# Number of candidates rejected by allowed()
+
+		self._file = open(file_path, 'rb')
+		self._map = None
+		try:
+			size = os.fstat(self._file.fileno()).st_size
+			if size < _header.size:
+				raise InvalidBlocklistFile('Blocklist file is truncated.')
+
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+			magic, self._count = _header.unpack_from(self._map, 0)
+			if magic != _blocklist_magic:
+				raise InvalidBlocklistFile('File is not a blocklist index.')
+
+			if size != _header.size + self._count*_hash.size:
+				raise InvalidBlocklistFile('Blocklist file is truncated.')
+		except:
+			self.close()
+			raise
+
+	def close(self):
+		'''
+		Close the index.
+		'''
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+	def allowed(self, generate, dedup_filter=None, max_attempts=100):
+		'''
+		Call a generating function until it returns a candidate that is not in the blocklist (and,
+		if a duplicate filter is given, not a duplicate).
+
+		@param generate A function taking no arguments which returns a new candidate password.
+		@type generate function
+
+		@param dedup_filter If specified, candidates already in this filter are also rejected, and
+							the returned candidate is added to it. [Default: None]
+		@type dedup_filter bloom_filter.BloomFilter
+
+		@param max_attempts The maximum number of candidates to try. [Default: 100]
+		@type max_attempts int
+
+		@return Returns the first acceptable candidate.
+
+		@throws BlocklistLimitError Raised if every candidate was rejected.
+		'''
+		for ii in range(0, max_attempts):
+			candidate = generate()
+			if candidate in self:
+				self.rejected += 1
+				continue
+
+			if dedup_filter is not None and dedup_filter.add(candidate):
+				continue
+
+			return candidate
+
+		raise BlocklistLimitError('No acceptable password found in '+str(max_attempts)+\
+								  ' attempts.')
+
+	def __contains__(self, password):
+		'''
+		Check whether a password is in the blocklist. The hashes are uniformly distributed, so the
+		search starts at the interpolated position and gallops outward to bracket the hash before
+		bisecting, which typically touches only one or two pages.
+		'''
+		count = self._count
+		if count == 0:
+			return False
+
+		target = password_hash(password)
+		mem = self._map
+		unpack = _hash.unpack_from
+		offset = _header.size
+		size = _hash.size
+
+		# Interpolated guess, then gallop to find lo <= position < hi
+		guess = min(count - 1, (target*count) >> 64)
+		step = 1
+		if unpack(mem, offset + guess*size)[0] <= target:
+			lo = guess
+			hi = guess + 1
+			while hi < count and unpack(mem, offset + hi*size)[0] <= target:
+				lo = hi
+				hi = min(count, hi + step)
+				step *= 2
+		else:
+			hi = guess
+			lo = max(0, guess - 1)
+			while lo > 0 and unpack(mem, offset + lo*size)[0] > target:
+				hi = lo
+				lo = max(0, lo - step)
+				step *= 2
+
+		while lo < hi:
+			mid = (lo + hi)//2
+			value = unpack(mem, offset + mid*size)[0]
+			if value == target:
+				return True
+			elif value < target:
+				lo = mid + 1
+			else:
+				hi = mid
+
+		return False
+
+	def __len__(self):
+		return self._count
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+# Exceptions
+class InvalidBlocklistFile(ValueError):
+	'''
+	Raised when a blocklist index file is invalid.
+	'''
+	pass
+
+class BlocklistLimitError(Exception):
+	'''
+	Raised when no password outside the blocklist could be generated within the allowed number of
+	attempts.
+	'''
+	pass
@@ -0,0 +1,256 @@
+'''
+Bloom filter library
+A compact probabilistic set, used to suppress duplicates in bulk password generation without
+keeping every generated password in memory.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, json, struct, hashlib
+from math import ceil, exp, log
+from file_helper import replace_file
+
+_bloom_magic = 'BLOOM'
+
+class BloomFilter(object):
+	'''
+	A Bloom filter with double hashing. Membership tests never give false negatives, and give false
+	positives at approximately the configured error rate until the filter has had more than its
+	capacity of items added to it.
+
+	The filter also counts how many items were checked and how many of those had (probably) been
+	seen before, and the resulting duplicate rate is a useful signal of the entropy of the model
+	the items came from.
+	'''
+
+	def __init__(self, capacity=None, error_rate=0.001, max_bytes=None):
+		'''
+		Constructor for the Bloom filter. At least one of capacity and max_bytes must be given. If
+		both are given and the capacity does not fit into max_bytes at the error rate, the capacity
+		is reduced to the number of items that do, so that the error rate holds up to capacity.
+
+		@param capacity The number of items the filter should hold at the given error rate.
+		@type capacity int
+
+		@param error_rate The desired false positive rate. [Default: 0.001]
+		@type error_rate float
+
+		@param max_bytes The memory budget for the bit array, in bytes. [Default: None]
+		@type max_bytes int
+
+		@throws ValueError Raised if the arguments are out of range.
+		'''
+		if not 0 < error_rate < 1:
+			raise ValueError('error_rate must be between 0 and 1.')
+
+		if capacity is None and max_bytes is None:
+			raise ValueError('At least one of capacity and max_bytes must be specified.')
+
+		if capacity is not None and capacity < 1:
+			raise ValueError('capacity must be a positive integer.')
+
+		if max_bytes is not None and max_bytes < 1:
+			raise ValueError('max_bytes must be a positive integer.')
+
+		# Optimal number of bits per item for the error rate is -ln(p)/ln(2)^2
+		bits_per_item = -log(error_rate)/(log(2)**2)
+		if capacity is None:
+			capacity = max(1, int(max_bytes*8/bits_per_item))
+
+		num_bits = int(ceil(capacity*bits_per_item))
+		if max_bytes is not None and num_bits > max_bytes*8:
+			num_bits = max_bytes*8
+			capacity = max(1, int(num_bits/bits_per_item))
+
+		num_bits = max(8, num_bits)
+
+		self.capacity = capacity
+		self.error_rate = error_rate
+		self._num_bits = num_bits
+		self._num_hashes = max(1, int(round(num_bits*log(2)/capacity)))
+		self._bits = bytearray((num_bits + 7)//8)
+
+		self.count = 0					# Number of distinct items added.
+		self.checked = 0				# Number of items passed to add()
+		self.duplicates = 0			# Number of those which were already present.
+
+	def add(self, item):
+		'''
+		Add an item to the filter.
+
+		@param item The item to add. Unicode strings are encoded as UTF-8.
+		@type item (str, unicode)
+
+		@return Returns True if the item was (probably) already in the filter, False otherwise.
+		'''
+		bits = self._bits
+		present = True
+		for position in self._positions(item):
+			mask = 1 << (position & 7)
+			if not bits[position >> 3] & mask:
+				bits[position >> 3] |= mask
+				present = False
+
+		self.checked += 1
+		if present:
+			self.duplicates += 1
+		else:
+			self.count += 1
+
+		return present
+
+	def unique(self, generate, max_attempts=100):
+		'''
+		Call a generating function until it returns an item that is not in the filter, and add that
+		item to the filter.
+
+		@param generate A function taking no arguments which returns a new candidate item.
+		@type generate function
+
+		@param max_attempts The maximum number of candidates to try. [Default: 100]
+		@type max_attempts int
+
+		@return Returns the first candidate not already in the filter.
+
+		@throws DuplicateLimitError Raised if every candidate was a duplicate.
+		'''
+		for ii in range(0, max_attempts):
+			candidate = generate()
+			if not self.add(candidate):
+				return candidate
+
+		raise DuplicateLimitError('No unique item found in '+str(max_attempts)+' attempts.')
+
+	@property
+	def duplicate_rate(self):
+		'''
+		The fraction of items passed to add() which were already present.
+		'''
+		return self.duplicates/float(self.checked) if self.checked else 0.0
+
+	@property
+	def estimated_error_rate(self):
+		'''
+		The expected false positive rate given the number of items currently in the filter.
+		'''
+		return (1 - exp(-self._num_hashes*self.count/float(self._num_bits)))**self._num_hashes
+
+	@property
+	def size_bytes(self):
+		'''
+		The size of the bit array in bytes.
+		'''
+		return len(self._bits)
+
+	def save(self, file_path):
+		'''
+		Save the filter so that it can be resumed in a later run. The file is a JSON header line
+		followed by the raw bit array. It is written to a temporary file which then replaces the
+		old one, so that a crash cannot leave a truncated filter behind.
+
+		@param file_path The path to save the filter to.
+		@type file_path str
+		'''
+		header = dict()
+		header['format'] = _bloom_magic
+		header['capacity'] = self.capacity
+		header['error_rate'] = self.error_rate
+		header['num_bits'] = self._num_bits
+		header['num_hashes'] = self._num_hashes
+		header['count'] = self.count
+		header['checked'] = self.checked
+		header['duplicates'] = self.duplicates
+
+		if os.path.dirname(file_path) and not os.path.exists(os.path.dirname(file_path)):
+			os.makedirs(os.path.dirname(file_path))
+
+		tmp_file_path = file_path+'.tmp'
+		with open(tmp_file_path, 'wb') as bloom_file:
+			bloom_file.write(json.dumps(header).encode('ascii') + b'\n')
+			bloom_file.write(self._bits)
+
+			bloom_file.flush()
+			os.fsync(bloom_file.fileno())
+
+		replace_file(tmp_file_path, file_path)
+
+	@classmethod
+	def load(cls, file_path):
+		'''
+		Load a filter saved with save().
+
+		@param file_path The path of the saved filter.
+		@type file_path str
+
+		@return Returns the BloomFilter.
+
+		@throws InvalidBloomFilterFile Raised if the file is not a valid saved filter.
+		'''
+		with open(file_path, 'rb') as bloom_file:
+			try:
+				header = json.loads(bloom_file.readline().decode('ascii'))
+			except ValueError:
+				raise InvalidBloomFilterFile('Could not read Bloom filter header.')
+
+			bits = bytearray(bloom_file.read())
+
+		if not isinstance(header, dict) or header.get('format', None) != _bloom_magic:
+			raise InvalidBloomFilterFile('File is not a saved Bloom filter.')
+
+		# Not through the constructor, which would allocate a bit array for the capacity.
+		bloom = cls.__new__(cls)
+		try:
+			bloom.capacity = header['capacity']
+			bloom.error_rate = header['error_rate']
+			bloom._num_bits = header['num_bits']
+			bloom._num_hashes = header['num_hashes']
+			bloom.count = header['count']
+			bloom.checked = header['checked']
+			bloom.duplicates = header['duplicates']
+		except KeyError as ke:
+			raise InvalidBloomFilterFile('Bloom filter header missing key '+ke.args[0])
+
+		if len(bits) != (bloom._num_bits + 7)//8:
+			raise InvalidBloomFilterFile('Bloom filter bit array is truncated.')
+
+		bloom._bits = bits
+
+		return bloom
+
+	def __contains__(self, item):
+		bits = self._bits
+		for position in self._positions(item):
+			if not bits[position >> 3] & (1 << (position & 7)):
+				return False
+
+		return True
+
+	def __len__(self):
+		return self.count
+
+	def _positions(self, item):
+		'''
+		The bit positions for an item, from two 64-bit hashes combined by double hashing.
+		'''
+		if not isinstance(item, bytes):
+			item = item.encode('utf-8')
+
+		h1, h2 = struct.unpack('>QQ', hashlib.md5(item).digest())
+		h2 |= 1 						# Odd, so the positions don't collapse onto h1.
+		num_bits = self._num_bits
+
+		return [(h1 + ii*h2) % num_bits for ii in range(0, self._num_hashes)]
+
+
+# Exceptions
+class DuplicateLimitError(Exception):
+	'''
+	Raised when no unique item could be generated within the allowed number of attempts.
+	'''
+	pass
+
+class InvalidBloomFilterFile(ValueError):
+	'''
+	Raised when a saved Bloom filter file is invalid.
+	'''
+	pass
@@ -0,0 +1,255 @@
+'''
+External sort library
+Sorts record streams that are too large to fit in memory by spilling sorted runs to temporary files
+and merging them back together from disk.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, sys, heapq, marshal, struct, shutil, tempfile
+from itertools import islice
+
+default_memory_limit = 64*1024*1024		# 64 MiB per in-memory run.
+default_max_open_runs = 64					# Maximum number of run files merged at once.
+
+_pointer_size = 8 if sys.maxsize > 2**32 else 4
+_uint64_block = 8192						# Integers per read or write of a packed run.
+
+def external_sort(records, memory_limit=default_memory_limit, temp_dir=None,
+						   max_open_runs=default_max_open_runs):
+	'''
+	Sort an iterable of records, using temporary run files on disk when the records do not fit into
+	the memory ceiling. Records must be tuples of strings, numbers and lists or tuples of these,
+	and are compared as tuples. The arguments are checked immediately, and a generator of the
+	sorted records is returned - temporary files are removed once it is exhausted or closed.
+
+	The memory ceiling is applied to the size of the buffered records as Python objects (see
+	_record_size()), and the buffer is sorted in place, so it is a reasonable bound on the memory
+	used. Records are released as they are yielded, so that sorts can be chained without each
+	holding a full buffer at once.
+
+	@param records An iterable of tuples to sort.
+	@type records iterable
+
+	@param memory_limit Approximate number of bytes of records to hold in memory before spilling a
+						 sorted run to disk. [Default: 64 MiB]
+	@type memory_limit int
+
+	@param temp_dir Directory in which to create the temporary run files. If None, the system
+					 default temporary directory is used. [Default: None]
+	@type temp_dir str
+
+	@param max_open_runs Maximum number of run files to merge at once. [Default: 64]
+	@type max_open_runs int
+
+	@return Yields the records in sorted order.
+
+	@throws ValueError Raised if memory_limit is not a positive integer or max_open_runs is less
+					   than 2.
+	'''
+	_check_sort_args(memory_limit, max_open_runs)
+
+	return _external_sort(records, memory_limit, temp_dir, max_open_runs,
+						  _record_size, _write_run, _read_run)
+
+def external_sort_uint64(values, memory_limit=default_memory_limit, temp_dir=None,
+								 max_open_runs=default_max_open_runs):
+	'''
+	Sort an iterable of unsigned 64-bit integers (e.g. fixed-width hashes). This works the same
+	way as external_sort(), but every value costs the same, so no per-value size estimate is
+	needed, and the runs are written as packed 8-byte integers rather than as records, which is
+	much faster and smaller on disk.
+
+	@param values An iterable of integers in the range [0, 2**64).
+	@type values iterable
+
+	@param memory_limit Approximate number of bytes of values to hold in memory before spilling a
+						 sorted run to disk. [Default: 64 MiB]
+	@type memory_limit int
+
+	@param temp_dir Directory in which to create the temporary run files. If None, the system
+					 default temporary directory is used. [Default: None]
+	@type temp_dir str
+
+	@param max_open_runs Maximum number of run files to merge at once. [Default: 64]
+	@type max_open_runs int
+
+	@return Yields the values in sorted order.
+
+	@throws ValueError Raised if memory_limit is not a positive integer or max_open_runs is less
+					   than 2.
+	'''
+	_check_sort_args(memory_limit, max_open_runs)
+
+	value_size = sys.getsizeof(2**64 - 1) + _pointer_size
+
+	return _external_sort(values, memory_limit, temp_dir, max_open_runs,
+						  lambda value: value_size, _write_uint64_run, _read_uint64_run)
+
+def _check_sort_args(memory_limit, max_open_runs):
+	'''
+	Check the arguments of the public sorts, which would otherwise only fail once iteration starts.
+	'''
+	if memory_limit < 1:
+		raise ValueError('memory_limit must be a positive integer.')
+
+	if max_open_runs < 2:
+		raise ValueError('max_open_runs must be at least 2.')
+
+def _external_sort(items, memory_limit, temp_dir, max_open_runs, item_size, write_run, read_run):
+	'''
+	The sort behind external_sort() and external_sort_uint64().
+
+	@param item_size Function giving the estimated memory held by a buffered item.
+	@param write_run Function writing a sorted iterable of items to a file object.
+	@param read_run Function yielding the items back from a file object.
+	'''
+	run_dir = None
+	try:
+		buff = []
+		buff_size = 0
+		runs = []
+		for item in items:
+			buff.append(item)
+			buff_size += item_size(item)
+
+			if buff_size >= memory_limit:
+				if run_dir is None:
+					run_dir = tempfile.mkdtemp(prefix='external_sort_', dir=temp_dir)
+
+				buff.sort()
+				runs.append(_save_run(buff, run_dir, len(runs), write_run))
+				buff = []
+				buff_size = 0
+
+		if not runs:
+			# Everything fit into memory, no need to touch the disk. Sort in reverse and pop from
+			# the end, so that each item is freed once it has been yielded.
+			buff.sort(reverse=True)
+			while buff:
+				yield buff.pop()
+
+			return
+
+		if buff:
+			buff.sort()
+			runs.append(_save_run(buff, run_dir, len(runs), write_run))
+		buff = None
+
+		# Merge down until the remaining runs can all be opened at once.
+		run_num = len(runs)
+		while len(runs) > max_open_runs:
+			merged_runs = []
+			for ii in range(0, len(runs), max_open_runs):
+				group = runs[ii:ii+max_open_runs]
+				merged_runs.append(_save_run(_merge_runs(group, read_run), run_dir, run_num,
+											 write_run))
+				run_num += 1
+
+				for run_path in group:
+					os.remove(run_path)
+
+			runs = merged_runs
+
+		for item in _merge_runs(runs, read_run):
+			yield item
+	finally:
+		if run_dir is not None:
+			shutil.rmtree(run_dir, ignore_errors=True)
+
+def _record_size(record):
+	'''
+	Estimate the memory held by a buffered record: the record itself, a pointer to it in the
+	buffer, and its fields. Lists and tuples within the record are counted recursively. Objects
+	shared between records (e.g. small integers) are counted each time, so this errs high.
+
+	@param record The record.
+
+	@return Returns the estimated size in bytes.
+	'''
+	size = sys.getsizeof(record) + _pointer_size
+	for value in record:
+		if isinstance(value, (list, tuple)):
+			size += _record_size(value) - _pointer_size
+		else:
+			size += sys.getsizeof(value)
+
+	return size
+
+def _save_run(items, run_dir, run_num, write_run):
+	'''
+	Write an already-sorted sequence of items to a run file.
+
+	@param items An iterable of sorted items.
+	@param run_dir The directory in which to write the run file.
+	@param run_num The number of the run, used for the file name.
+	@param write_run Function writing the items to a file object.
+
+	@return Returns the path to the run file.
+	'''
+	run_path = os.path.join(run_dir, 'run_{:06d}'.format(run_num))
+	with open(run_path, 'wb') as run_file:
+		write_run(items, run_file)
+
+	return run_path
+
+def _write_run(records, run_file):
+	'''
+	Write records to a run file. Run files only live as long as the sort, so they use marshal,
+	which is much faster to write and read back than JSON.
+	'''
+	dump = marshal.dump
+	for record in records:
+		dump(record, run_file)
+
+def _read_run(run_file):
+	'''
+	Read records back from an open run file.
+	'''
+	load = marshal.load
+	while True:
+		try:
+			yield load(run_file)
+		except EOFError:
+			return
+
+def _write_uint64_run(values, run_file):
+	'''
+	Write integers to a run file as packed big-endian 64-bit integers, a block at a time.
+	'''
+	values = iter(values)
+	while True:
+		block = list(islice(values, _uint64_block))
+		if not block:
+			return
+
+		run_file.write(struct.pack('>{}Q'.format(len(block)), *block))
+
+def _read_uint64_run(run_file):
+	'''
+	Read packed integers back from an open run file, a block at a time.
+	'''
+	while True:
+		data = run_file.read(_uint64_block*8)
+		if not data:
+			return
+
+		for value in struct.unpack('>{}Q'.format(len(data)//8), data):
+			yield value
+
+def _merge_runs(run_paths, read_run):
+	'''
+	Merge a number of sorted run files.
+
+	@param run_paths A list of paths to sorted run files.
+	@param read_run Function yielding the items from a file object.
+
+	@return Yields the merged items in sorted order.
+	'''
+	run_files = [open(run_path, 'rb') for run_path in run_paths]
+	try:
+		for item in heapq.merge(*[read_run(run_file) for run_file in run_files]):
+			yield item
+	finally:
+		for run_file in run_files:
+			run_file.close()
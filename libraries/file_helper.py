@@ -0,0 +1,28 @@
+'''
+Library containing file handling helpers.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os
+
+def replace_file(src, dst):
+	'''
+	Rename src to dst, replacing dst. This is atomic on POSIX systems, so anything opening dst
+	sees either the old file or the new one. On Windows, os.rename() cannot replace an existing
+	file, so dst has to be removed first.
+
+	@param src The path of the new file.
+	@type src str
+
+	@param dst The path to replace.
+	@type dst str
+	'''
+	try:
+		os.rename(src, dst)
+	except OSError:
+		if not os.path.exists(dst):
+			raise
+
+		os.remove(dst)
+		os.rename(src, dst)
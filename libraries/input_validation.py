@@ -7,6 +7,8 @@ Library for easy validation of common inputs.
 '''
 import warnings
 
+_name_regex = None			# Compiled on first use by valid_name()
+
 def valid_string_type(input, throw_error=False, warn=False, repr_on_fail=False,
 						string_types=(str,unicode)):
 	'''
@@ -44,6 +46,36 @@ def valid_string_type(input, throw_error=False, warn=False, repr_on_fail=False,
 		return input if repr_on_fail else True
 
 
+def valid_name(input, throw_error=False):
+	'''
+	Check if the string is a valid database name, which can only contain alphanumeric characters,
+	spaces, dashes and underscores. The regular expression is compiled once, on first use.
+
+	@param throw_error Throw an error if the name is not valid. [Default: False]
+	@type throw_error bool
+
+	@return Returns boolean value of whether the name validated or not.
+
+	@throws NotStringTypeError Raised if parameter throw_error is true and input is not a string.
+	@throws ValueError Raised if parameter throw_error is true and the name does not validate.
+	'''
+	global _name_regex
+
+	if not valid_string_type(input, throw_error=throw_error):
+		return False
+
+	if _name_regex is None:
+		import re
+		_name_regex = re.compile(r'^[\w_ -]+$')
+
+	if _name_regex.match(input) is None:
+		if throw_error:
+			raise ValueError('"name" can only contain alphanumeric characters, spaces, dashes '+\
+							 ' and underscores.')
+
+		return False
+
+	return True
 
 # Exceptions
 class NotStringTypeError(TypeError):
@@ -7,16 +7,21 @@ Library for arbitrary Markov chain generation
 @todo Separate out the Settings stuff into a separate file so that this can be used independently in
       unrelated projects.
 '''
-import re, json, os, random, zlib
+import os, random
 from time import time
 from sys import stdout
 import input_validation
-from copy import copy as cp
 from exception_helper import OutOfSyncError, FileExists, RandomnessSourceUndefined
-from settings_helper import SettingsHelper, SettingsReader
+from file_helper import replace_file
+
+# json, zlib, copy, marshal, the settings and the external sort are imported where they are used,
+# to keep importing this library (and so starting up short-lived tools) fast.
 
 _markov_ext = '.mjson'      # Markov JSON
 _m_zip = '.mjson.gz'        # Compressed JSON.
+_m_stream = '.mjsonl'       # Streaming (line-delimited) JSON, written by build_external()
+_m_snap = '.msnap'          # marshal snapshot, written by save_snapshot()
+_m_journal = '.journal'     # Appended to the database file name for its journal of updates.
 
 class MarkovDB:
     '''
@@ -64,11 +69,7 @@ class MarkovDB:
         '''
         
         # Validate the inputs
-        input_validation.valid_string_type(name, throw_error=True)
-
-        if re.match('^[\w_ -]+$', name) is None:
-            raise ValueError('"name" can only contain alphanumeric characters, spaces, dashes '+\
-                             ' and underscores.')
+        input_validation.valid_name(name, throw_error=True)
 
         if min_state_length < 1:
             raise ValueError('min_state_length must be a positive integer.')
@@ -88,6 +89,8 @@ class MarkovDB:
         self._db_generated = False
         self._rng = random.SystemRandom()
         self._saved_loc = None
+        self._journal_id = None              # Identifies the saved file the journal applies to.
+        self._journal_pending = None         # Updates since the last save, None if unsaved.
         
         # Construct the object
         self.name = name
@@ -122,6 +125,11 @@ class MarkovDB:
             current_time_millis = lambda: int(round(time() * 1000))    # SO/questions/5998245/
             stime = current_time_millis()
 
+        # The states at each position are only needed once the database is generated, so they
+        # are allocated here rather than with the source.
+        if not self._db_generated:
+            self._source_by_state = [[] for x in range(0, len(self._source))]
+
         if print_progress:
             prog_len = 1.0*len(self._source)*(self.max_state_length-self.min_state_length+1)
             kk = 0; l_prog = -1; char_set = ('[', ']'); csi = 0
@@ -158,27 +166,86 @@ class MarkovDB:
             stdout.write('\n')
 
         if print_time:
-            time_elapsed = (current_time_millis() - stime)/1000.0;
-            hours = int(time_elapsed/3600); time_elapsed -= hours*3600
-            minutes = int(time_elapsed/60); time_elapsed -= minutes*60
-            seconds = time_elapsed
-            if hours > 0:
-                stdout.write('{:0.0f}h '.format(hours))
-            if minutes > 0:
-                stdout.write('{:0.0f}m '.format(minutes))
-
-            stdout.write('{:02.3f}s\n'.format(seconds))
+            _print_elapsed((current_time_millis() - stime)/1000.0)
 
         self._db_generated = True
+        self._journal_pending = None        # Needs a full save.
+
+    def extend_source(self, source):
+        '''
+        Append to the source. If the database has already been generated, the states starting in
+        the new part of the source (or running into it) are added to the database incrementally,
+        which gives the same database as generating from the combined source. The changes are
+        recorded so that the next save() can append them to the journal rather than rewriting
+        the whole file.
+
+        @param source The entries to append. Must be a string if the source is a string, and a
+                      list or tuple otherwise.
+        @type source (str, unicode, list, tuple)
 
-    def save(self, save_location=None, overwrite=True, compress=True):
+        @throws TypeError Raised if the new entries are of the wrong type for the source.
+        '''
+        if not self._valid_source:
+            self._add_source(source)
+            self._journal_pending = None
+            return
+
+        old_len = len(self._source)
+        self._extend_source(source)
+
+        added_states = []
+        if self._db_generated:
+            # Same traversal as generate(), but only adding the states which were not complete
+            # in the old source.
+            for ii in range(max(0, old_len - self.max_state_length + 1), len(self._source)):
+                for jj in range(self.min_state_length, self.max_state_length+1):
+                    if ii + jj > len(self._source):
+                        break
+
+                    state = self._source[ii:ii+jj]
+                    if ii + jj <= old_len:
+                        delimiter_found = self._delimiter is not None and self._delimiter in state
+                    else:
+                        delimiter_found = self._add_state(state, ii)
+                        added_states.append([state if isinstance(state, (str, unicode)) \
+                                                   else list(state), ii])
+
+                    if delimiter_found:
+                        break
+
+        if self._journal_pending is not None:
+            journal_record = dict()
+            journal_record['source'] = source if isinstance(source, (str, unicode)) \
+                                              else list(source)
+            journal_record['states'] = added_states
+            journal_record['included_states'] = self._included_states
+            self._journal_pending.append(journal_record)
+
+    def save(self, save_location=None, overwrite=True, compress=True, compact=None):
         '''
         Save the database to a json file so that it does not need to be generated from the source 
         with each new instance.
 
+        If the database was loaded from or last saved to the same file, only the updates made by
+        extend_source() since then are appended to the file's journal, so that the cost of saving
+        is proportional to the size of the update. Once the journal grows past half the size of
+        the file it is compacted: the whole database is written to a temporary file which then
+        replaces the old file by an atomic rename, so that a crash cannot corrupt the saved copy.
+
         @param save_location The directory into which the file should be saved. [Default: None]
         @type save_location str
 
+        @param overwrite Whether to overwrite an existing database file. [Default: True]
+        @type overwrite bool
+
+        @param compress Whether to compress the database file. [Default: True]
+        @type compress bool
+
+        @param compact If True, always rewrite the whole file. If False, always append to the 
+                       journal when possible. If None, compact when the journal gets too large.
+                       [Default: None]
+        @type compact bool
+
         @throws TypeError Raised when argument inputs are of the wrong type.
         @throws InvalidMarkovSourceError Raised when no valid markov source is present.
         '''
@@ -192,32 +259,37 @@ class MarkovDB:
                 save_location = os.path.dirname(self._saved_loc)
             else:
                 # Else use the default location, check the settings file.
-                save_location = SettingsReader().getValue(SettingsHelper.markov_source_loc_key)
+                from settings_helper import get_markov_save_location
+                save_location = get_markov_save_location()
 
         fext = _m_zip if compress else _markov_ext
         save_file_path = os.path.join(save_location, self.name+fext)
         if not overwrite and os.path.exists(save_file_path):
             raise FileExists('Markov database file '+self.name+fext+' already exists.')
 
-        # Turn this into a dictionary for JSON serialization
-        markov_dict = dict()
-        markov_dict['version'] = self.__db_version__
-        markov_dict['name'] = self.name
-        markov_dict['source'] = self._source
-        markov_dict['valid_source'] = self._valid_source
-        markov_dict['db_generated'] = self._db_generated
-        markov_dict['source_by_state'] = self._source_by_state
-        markov_dict['state_index'] = self._state_index
-        markov_dict['state_positions'] = self._state_positions
-        markov_dict['state_occurances'] = self._state_occurances
-        markov_dict['state_delimited'] = self._state_delimited
-        markov_dict['included_states'] = self._included_states
+        import json, zlib
+
+        journal_path = save_file_path+_m_journal
+        if compact is not True and self._journal_pending is not None and \
+           self._journal_id is not None and self._saved_loc is not None and \
+           os.path.exists(save_file_path) and \
+           os.path.abspath(save_file_path) == os.path.abspath(self._saved_loc):
+            journal_size = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+            if compact is False or journal_size <= os.path.getsize(save_file_path)//2:
+                self._append_journal(journal_path)
+                return
+
+        # Turn this into a dictionary for JSON serialization, with a new journal ID so that any
+        # journal left over from the old file is not replayed onto the new one.
+        self._journal_id = self._new_journal_id()
+        markov_dict = self._to_dict()
 
         # Save the file with JSON
         if not os.path.exists(os.path.dirname(save_file_path)):
             os.makedirs(os.path.dirname(save_file_path))
 
-        with open(save_file_path, 'w+') as save_file:
+        tmp_file_path = save_file_path+'.tmp'
+        with open(tmp_file_path, 'wb' if compress else 'w') as save_file:
             if compress:
                 cdata = zlib.compress(json.dumps(markov_dict))
                 save_file.write(cdata)
@@ -226,79 +298,318 @@ class MarkovDB:
                     indent=4,
                     separators=(',', ': '))
 
+            save_file.flush()
+            os.fsync(save_file.fileno())
+
+        replace_file(tmp_file_path, save_file_path)
+
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
 
         self._saved_loc = save_file_path
+        self._journal_pending = []
 
-        
-    def load(self, file_path=None):
+    def save_snapshot(self, save_location=None, overwrite=True):
         '''
-        Load a saved database from file.
+        Save the database as a marshal snapshot. Snapshots load much faster than the JSON formats,
+        which makes them suited to short-lived processes, but they can only be read by the same
+        version of Python that wrote them, so they should be treated as a cache of a saved
+        database rather than a replacement for one. load() prefers the newest saved file, so a
+        snapshot taken after the last save() will be used.
 
-        @param file_path The path of the file to load. If None, this will be generated from the 
-                         default save location and the name passed to the constructor.
-        @type file_path str
+        @param save_location The directory into which the file should be saved. [Default: None]
+        @type save_location str
 
-        @throws TypeError Raised when argument inputs are of the wrong type.
-        @throws ValueError Raised when an invalid path is passed to file_path
+        @param overwrite Whether to overwrite an existing snapshot. [Default: True]
+        @type overwrite bool
+
+        @return Returns the path to the snapshot.
+
+        @throws InvalidMarkovSourceError Raised when no valid markov source is present.
+        @throws FileExists Raised if overwrite is False and the snapshot already exists.
         '''
-        if file_path is None:
-            if os.path.exists(self._saved_loc):
-                # For recalling a previous state.
-                file_path = self._saved_loc
+        import marshal, sys
+
+        if not self._valid_source:
+            raise InvalidMarkovSourceError('Markov source must be valid before saving to file.')
+
+        if save_location is None:
+            if self._saved_loc is not None and os.path.exists(self._saved_loc):
+                save_location = os.path.dirname(self._saved_loc)
             else:
-                base_fname = os.path.join(SettingsReader().getValue(\
-                    SettingsHelper.markov_source_loc_key), self.name)
-                
-                decompressed_file_exists = os.path.exists(base_fname+_markov_ext)
-                compressed_file_exists = os.path.exists(base_fname+_m_zip)
-
-                if decompressed_file_exists and compressed_file_exists:
-                    # Find out which one's newer.
-                    if os.path.getmtime(base_fname+_markov_ext) >= \
-                       os.path.getmtime(base_fname+_m_zip):
-                        fext = _markov_ext
-                    else:
-                        fext = _m_zip
-                elif decompressed_file_exists:
-                    fext = _markov_ext
+                from settings_helper import get_markov_save_location
+                save_location = get_markov_save_location()
+
+        save_file_path = os.path.join(save_location, self.name+_m_snap)
+        if not overwrite and os.path.exists(save_file_path):
+            raise FileExists('Markov snapshot file '+self.name+_m_snap+' already exists.')
+
+        if not os.path.exists(os.path.dirname(save_file_path)):
+            os.makedirs(os.path.dirname(save_file_path))
+
+        markov_dict = self._to_dict()
+        markov_dict['python_version'] = tuple(sys.version_info[:2])
+
+        with open(save_file_path, 'wb') as save_file:
+            marshal.dump(markov_dict, save_file)
+
+        self._saved_loc = save_file_path
+
+        return save_file_path
+
+    def build_external(self, save_location=None, overwrite=True,
+                             memory_limit=None, temp_dir=None, source=None):
+        '''
+        Build the Markov database without holding the state positions in memory, for sources whose
+        database does not fit in RAM. Each (state, position) record is written to temporary run
+        files, which are sort-merged on disk, and the database is written directly to a streaming
+        (line-delimited JSON) file. Loading the resulting file gives the same database as calling
+        generate() and then save().
+
+        The streaming file contains a header line, the source, one line per state of the form
+        ["s", state, delimited, positions], one line per source position of the form ["p", states]
+        and a trailer line used to verify that the file is complete.
+
+        @param save_location The directory into which the file should be saved. [Default: None]
+        @type save_location str
+
+        @param overwrite Whether to overwrite an existing database file. [Default: True]
+        @type overwrite bool
+
+        @param memory_limit Approximate number of bytes of records held in memory during each sort
+                            before spilling to a temporary run file. If None, the external_sort
+                            default (64 MiB) is used. [Default: None]
+        @type memory_limit int
+
+        @param temp_dir Directory in which to create the temporary run files. If None, the system
+                        default temporary directory is used. [Default: None]
+        @type temp_dir str
+
+        @param source An iterable of pieces of the source (e.g. blocks read from a file), all 
+                      strings or all lists, which is read once and never held in memory as a 
+                      whole. If None, the source passed to the constructor is used. 
+                      [Default: None]
+        @type source iterable
+
+        @return Returns the path to the database file.
+
+        @throws InvalidMarkovSourceError Raised when no valid markov source is present.
+        @throws FileExists Raised if overwrite is False and the database file already exists.
+        @throws TypeError Raised if the pieces of source are not all strings or all lists.
+        @throws ValueError Raised if memory_limit is not a positive integer.
+        '''
+        if source is None:
+            if not self._valid_source:
+                raise InvalidMarkovSourceError('Valid source must be provided before '+\
+                                               'generating database.')
+            source = [self._source]
+
+        import json
+        from external_sort import external_sort, default_memory_limit
+
+        if memory_limit is None:
+            memory_limit = default_memory_limit
+
+        if memory_limit < 1:
+            raise ValueError('memory_limit must be a positive integer.')
+
+        if save_location is None:
+            from settings_helper import get_markov_save_location
+            save_location = get_markov_save_location()
+
+        save_file_path = os.path.join(save_location, self.name+_m_stream)
+        if not overwrite and os.path.exists(save_file_path):
+            raise FileExists('Markov database file '+self.name+_m_stream+' already exists.')
+
+        if not os.path.exists(os.path.dirname(save_file_path)):
+            os.makedirs(os.path.dirname(save_file_path))
+
+        source_len = [0]
+        sort_args = dict(memory_limit=memory_limit, temp_dir=temp_dir)
+
+        def state_records(mdb_file):
+            # Same traversal as generate(), emitting (state, position, length) records. Only the
+            # last max_state_length-1 entries of each piece are kept, to complete the states which
+            # run into the next one. Each piece is copied to the source line of the file as it is
+            # read, which is finished before any state lines are written, because the sort reads
+            # all of its input before returning the first record.
+            buf = None
+            base = 0
+            for piece in source:
+                if not len(piece):
+                    continue
+
+                is_string = isinstance(piece, (str, unicode))
+                if not is_string and not isinstance(piece, (list, tuple)):
+                    raise TypeError('Source must be a string, list or tuple.')
+
+                if buf is None:
+                    buf = piece if is_string else list(piece)
+                    mdb_file.write('"' if is_string else '[')
+                elif is_string != isinstance(buf, (str, unicode)):
+                    raise TypeError('Pieces of the source must all be strings or all be lists.')
                 else:
-                    fext = _m_zip
-                
-                file_path = os.path.join(SettingsReader().getValue(\
-                                     SettingsHelper.markov_source_loc_key), self.name+fext)
+                    buf = buf + (piece if is_string else list(piece))
+                    if not is_string:
+                        mdb_file.write(', ')
 
-        # Raise an error if this is an invalid string type.
-        input_validation.valid_string_type(file_path, throw_error=True) 
+                if is_string:
+                    mdb_file.write(json.dumps(piece)[1:-1])
+                else:
+                    mdb_file.write(', '.join(json.dumps(entry) for entry in piece))
+
+                source_len[0] += len(piece)
+
+                complete = len(buf) - self.max_state_length + 1
+                for record in window_records(buf, base, complete):
+                    yield record
+
+                if complete > 0:
+                    buf = buf[complete:]
+                    base += complete
+
+            if buf is None:
+                mdb_file.write('""\n')
+                return
+
+            for record in window_records(buf, base, len(buf)):
+                yield record
+
+            mdb_file.write('"\n' if isinstance(buf, (str, unicode)) else ']\n')
+
+        def window_records(buf, base, stop):
+            for ii in range(0, stop):
+                for jj in range(self.min_state_length, self.max_state_length+1):
+                    if ii + jj > len(buf):
+                        break
+
+                    state = buf[ii:ii+jj]
+                    yield (state if isinstance(state, (str, unicode)) else list(state), base+ii, jj)
+
+                    if self._delimiter is not None and self._delimiter in state:
+                        break
+
+        def first_occurance_records(mdb_file):
+            # Group identical states, tagging each position with the state's first occurance,
+            # which is the order in which generate() assigns state indices. The state itself is
+            # only carried by the record for its first occurance, which sorts first in its group.
+            last_state = None
+            first_pos = None
+            for state, position, length in external_sort(state_records(mdb_file), **sort_args):
+                if first_pos is None or state != last_state:
+                    last_state = state
+                    first_pos = position
+                    yield (first_pos, length, position, state)
+                else:
+                    yield (first_pos, length, position, None)
+
+        included_states = [0]
+
+        def write_states(mdb_file):
+            # Assign indices in order of first occurance and write out the state lines, emitting a
+            # (position, length, index) record for each position the state appears at.
+            state_pos = -1
+            last_key = None
+            for first_pos, length, position, state in external_sort(
+                                                        first_occurance_records(mdb_file),
+                                                        **sort_args):
+                if (first_pos, length) != last_key:
+                    if last_key is not None:
+                        mdb_file.write(']]\n')
+
+                    last_key = (first_pos, length)
+                    state_pos += 1
+
+                    delimited = self._delimiter is not None and self._delimiter in state
+                    mdb_file.write('["s", '+json.dumps(state)+', '+json.dumps(delimited)+', [')
+                    mdb_file.write(str(position))
+                else:
+                    mdb_file.write(', '+str(position))
 
-        if not os.path.exists(file_path):
-            raise ValueError('Path is not valid.')
+                included_states[0] += 1
+                yield (position, length, state_pos)
 
-        # Load the JSON file.
-        with open(file_path, 'r') as mdb_file:
-            if file_path.endswith(_m_zip):  # Compressed
-                ddata = zlib.decompress(mdb_file.read())
-                markov_dict = json.loads(ddata)
-            else:
-                markov_dict = json.load(mdb_file)
-        try:
-            self.name = markov_dict['name']
-            self._valid_source = markov_dict['valid_source']
-            if self._valid_source:
-                self._add_source(markov_dict['source'])
-    
-            self._db_generated = markov_dict['db_generated']
+            if last_key is not None:
+                mdb_file.write(']]\n')
 
-            if self._db_generated:
-                self._source_by_state = markov_dict['source_by_state']
-                self._state_index = markov_dict['state_index']
-                self._state_occurances = markov_dict['state_occurances']
-                self._included_states = markov_dict['included_states']
-                self._state_delimited = markov_dict['state_delimited']
+        with open(save_file_path, 'w+') as mdb_file:
+            header = dict()
+            header['version'] = self.__db_version__
+            header['format'] = 'stream'
+            header['name'] = self.name
+            mdb_file.write(json.dumps(header)+'\n')
 
-        except KeyError as ke:
-            raise InvalidMarkovDatabaseFile('Error reading Markov file key '+ke.args[0], ke=ke)
+            # The states at each position, in the order generate() would have added them.
+            next_position = 0
+            position_states = []
+            for position, length, state_pos in external_sort(write_states(mdb_file), **sort_args):
+                while next_position < position:
+                    mdb_file.write(json.dumps(['p', position_states])+'\n')
+                    position_states = []
+                    next_position += 1
 
-        self._saved_loc = file_path
+                position_states.append(state_pos)
+
+            while next_position < source_len[0]:
+                mdb_file.write(json.dumps(['p', position_states])+'\n')
+                position_states = []
+                next_position += 1
+
+            mdb_file.write(json.dumps(['end', {'included_states' : included_states[0]}])+'\n')
+
+        self._saved_loc = save_file_path
+
+        return save_file_path
+
+    def load(self, file_path=None):
+        '''
+        Load a saved database from file.
+
+        @param file_path The path of the file to load. If None, this will be generated from the 
+                         default save location and the name passed to the constructor, using the
+                         newest of the saved files. Snapshots are only a cache, so if the newest
+                         file is a snapshot that can't be read (e.g. it was written by another
+                         version of Python), the next newest file is used instead.
+        @type file_path str
+
+        @throws TypeError Raised when argument inputs are of the wrong type.
+        @throws ValueError Raised when an invalid path is passed to file_path
+        @throws InvalidMarkovDatabaseFile Raised when the file is malformed, or is a snapshot 
+                                          written by a different version of Python.
+        '''
+        if file_path is not None:
+            self._load_file(file_path)
+        elif self._saved_loc is not None and os.path.exists(self._saved_loc):
+            # For recalling a previous state.
+            self._load_file(self._saved_loc)
+        else:
+            from settings_helper import get_markov_save_location
+            base_fname = os.path.join(get_markov_save_location(), self.name)
+
+            # Try the saved files from newest to oldest, defaulting to the compressed one.
+            candidates = []
+            for c_ext in (_markov_ext, _m_zip, _m_stream, _m_snap):
+                if os.path.exists(base_fname+c_ext):
+                    mtime = os.path.getmtime(base_fname+c_ext)
+                    if os.path.exists(base_fname+c_ext+_m_journal):
+                        mtime = max(mtime, os.path.getmtime(base_fname+c_ext+_m_journal))
+
+                    candidates.append((mtime, base_fname+c_ext))
+
+            candidates = [c_path for mtime, c_path in sorted(candidates, reverse=True)]
+            if not candidates:
+                candidates = [base_fname+_m_zip]
+
+            for c_path in candidates:
+                if c_path.endswith(_m_snap) and c_path != candidates[-1]:
+                    try:
+                        self._load_file(c_path)
+                    except InvalidMarkovDatabaseFile:
+                        continue        # Stale snapshot, fall back to the saved database.
+                else:
+                    self._load_file(c_path)
+
+                return
 
     def get_chain(self, num_states, 
                         seed=None, random_seed_weighted=False,
@@ -311,7 +622,7 @@ class MarkovDB:
         @type int
 
         @param seed The state with which to seed the state. If None is passed to this parameter, a 
-                    state will be selected randomly.
+                    state will be selected randomly from those not containing the delimiter.
         @type seed state
 
         @param random_seed_weighted If set to True, a random position in the source is chosen and a 
@@ -347,11 +658,7 @@ class MarkovDB:
                 raise RandomnessSourceUndefined('Randomness source needed for Markov chain '+\
                                                 'generation.')
 
-            if random_seed_weighted:
-                seed_index = self._rng.choice(self._rng.choice(self._source_by_state))
-                seed = self._state_index[seed_index]
-            else:
-                seed = self._rng.choice(self._state_index)
+            seed = self._state_index[self._random_state_index(random_seed_weighted)]
 
         # Validate the seed.
         if seed not in self._state_index:
@@ -373,7 +680,7 @@ class MarkovDB:
 
     def get_chain_as_string(self, num_states, 
                             seed=None, random_seed_weighted=False, 
-                            delimiter=None):
+                            delimiter=None, dedup_filter=None, blocklist=None):
         '''
         Call the get_chain method, then concatenate it to a string. This will only work if the 
         source material is also made of strings.
@@ -382,7 +689,7 @@ class MarkovDB:
         @type int
 
         @param seed The state with which to seed the state. If None is passed to this parameter, a 
-                    state will be selected randomly.
+                    state will be selected randomly from those not containing the delimiter.
         @type seed state
 
         @param random_seed_weighted If set to True, a random position in the source is chosen and a 
@@ -392,26 +699,337 @@ class MarkovDB:
 
         @param delimiter Break if the chain encounters anything in this list. (Not implemented)
         @type delimiter (str, list, set, tuple)
+
+        @param dedup_filter If specified, chains already in this filter are regenerated, and the 
+                            returned chain is added to it. [Default: None]
+        @type dedup_filter bloom_filter.BloomFilter
+
+        @param blocklist If specified, chains in this blocklist are rejected and regenerated.
+                         [Default: None]
+        @type blocklist blocklist.Blocklist
         
         @return Returns a chain of states as a string.
 
         @throws TypeError Thrown if the source is not made up of strings or characters.
         @throws ValueError Thrown if num_states is not a positive integer.
         @throws InvalidMarkovStateError Thrown if seed is not a valid state.
+        @throws DuplicateLimitError Thrown if no unique chain could be generated.
+        @throws BlocklistLimitError Thrown if no chain outside the blocklist could be generated.
         '''
+        if blocklist is not None or dedup_filter is not None:
+            generate = lambda: self.get_chain_as_string(num_states=num_states, seed=seed,
+                                                        random_seed_weighted=random_seed_weighted)
+            if blocklist is not None:
+                return blocklist.allowed(generate, dedup_filter=dedup_filter)
+
+            return dedup_filter.unique(generate)
+
         chain = self.get_chain(num_states=num_states, 
                                seed=seed, 
                                random_seed_weighted=random_seed_weighted)
 
-        out_chain = ''
-        for state in chain:
-            input_validation.valid_string_type(state, throw_error=True)
+        # States taken from a string source are always strings, so only check list sources.
+        if not isinstance(self._source, (str, unicode)):
+            for state in chain:
+                input_validation.valid_string_type(state, throw_error=True)
 
-            out_chain += state
-
-        return out_chain
+        return ''.join(chain)
 
     # Private methods
+    def _to_dict(self):
+        '''
+        The database as a dictionary, for serialization.
+        '''
+        markov_dict = dict()
+        markov_dict['version'] = self.__db_version__
+        markov_dict['name'] = self.name
+        markov_dict['source'] = self._source
+        markov_dict['valid_source'] = self._valid_source
+        markov_dict['db_generated'] = self._db_generated
+        markov_dict['source_by_state'] = self._source_by_state
+        markov_dict['state_index'] = self._state_index
+        markov_dict['state_positions'] = self._state_positions
+        markov_dict['state_occurances'] = self._state_occurances
+        markov_dict['state_delimited'] = self._state_delimited
+        markov_dict['included_states'] = self._included_states
+        markov_dict['min_state_length'] = self.min_state_length
+        markov_dict['max_state_length'] = self.max_state_length
+        markov_dict['delimiter'] = self._delimiter
+        markov_dict['journal_id'] = self._journal_id
+
+        return markov_dict
+
+    def _from_dict(self, markov_dict):
+        '''
+        Restore the database from a dictionary created by _to_dict().
+
+        @throws InvalidMarkovDatabaseFile Raised if a key is missing.
+        '''
+        try:
+            self.name = markov_dict['name']
+            self._valid_source = markov_dict['valid_source']
+            self._db_generated = markov_dict['db_generated']
+
+            if self._valid_source:
+                if self._db_generated:
+                    # No need to copy the source, as _add_source() would, since the saved values
+                    # are used directly.
+                    self._source = markov_dict['source']
+                else:
+                    self._add_source(markov_dict['source'])
+
+            if self._db_generated:
+                self._source_by_state = markov_dict['source_by_state']
+                self._state_index = markov_dict['state_index']
+                self._state_positions = markov_dict['state_positions']
+                self._state_occurances = markov_dict['state_occurances']
+                self._included_states = markov_dict['included_states']
+                self._state_delimited = markov_dict['state_delimited']
+
+        except KeyError as ke:
+            raise InvalidMarkovDatabaseFile('Error reading Markov file key '+ke.args[0], ke=ke)
+
+        # Not present in files from older versions.
+        self.min_state_length = markov_dict.get('min_state_length', self.min_state_length)
+        self.max_state_length = markov_dict.get('max_state_length', self.max_state_length)
+        self._delimiter = markov_dict.get('delimiter', self._delimiter)
+        self._journal_id = markov_dict.get('journal_id', None)
+
+    def _extend_source(self, source):
+        '''
+        Append entries to the source, without adding any states.
+        '''
+        if isinstance(self._source, (str, unicode)):
+            if not isinstance(source, (str, unicode)):
+                raise TypeError('Can only extend a string source with a string, given '+\
+                                type(source).__name__)
+        elif not isinstance(source, (list, tuple)):
+            raise TypeError('Can only extend a list source with a list or tuple, given '+\
+                            type(source).__name__)
+
+        if isinstance(self._source, list):
+            self._source.extend(source)
+        else:
+            self._source = self._source + type(self._source)(source)
+
+        if self._db_generated:
+            self._source_by_state.extend([] for x in range(0, len(source)))
+
+    def _new_journal_id(self):
+        '''
+        A random identifier tying a journal to the file it was started from.
+        '''
+        from binascii import hexlify
+        return hexlify(os.urandom(8)).decode('ascii')
+
+    def _append_journal(self, journal_path):
+        '''
+        Append the pending updates to the journal, starting it if necessary. Each line is a JSON 
+        record, the first identifying the saved file the journal applies to.
+
+        If the journal ends in a torn record (from a crash part-way through an append), it is cut
+        off first, so that the new records don't run on from it. If the journal belongs to a file
+        that has since been replaced, it is started over.
+
+        @param journal_path The path of the journal.
+        '''
+        import json
+
+        if not self._journal_pending:
+            return
+
+        if self._journal_id is None:
+            raise OutOfSyncError('Cannot journal updates to a file without a journal ID.')
+
+        lines = []
+        for journal_record in self._journal_pending:
+            lines.append(json.dumps(journal_record))
+
+        with open(journal_path, 'r+b' if os.path.exists(journal_path) else 'w+b') as journal_file:
+            valid_end = self._journal_valid_end(journal_file)
+            if valid_end == 0:
+                lines.insert(0, json.dumps({'journal_id' : self._journal_id}))
+
+            journal_file.seek(valid_end)
+            journal_file.truncate()
+            journal_file.write(('\n'.join(lines)+'\n').encode('utf-8'))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        self._journal_pending = []
+
+    def _journal_valid_end(self, journal_file):
+        '''
+        Find where new records can be appended to a journal: after its last complete record, or
+        at the start if it is empty or does not belong to the loaded file.
+
+        @param journal_file The journal, opened for reading in binary mode.
+
+        @return Returns the offset in bytes.
+        '''
+        import json
+
+        journal_file.seek(0)
+        header = journal_file.readline()
+        if not header.endswith(b'\n'):
+            return 0
+
+        try:
+            if json.loads(header.decode('utf-8')).get('journal_id', None) != self._journal_id:
+                return 0
+        except (ValueError, AttributeError):
+            return 0
+
+        # Only a crash can leave a record without its newline, so this search is rarely needed.
+        journal_file.seek(0, os.SEEK_END)
+        end = journal_file.tell()
+        while end > len(header):
+            block_start = max(len(header), end - 4096)
+            journal_file.seek(block_start)
+            block = journal_file.read(end - block_start)
+            if b'\n' in block:
+                return block_start + block.rindex(b'\n') + 1
+
+            end = block_start
+
+        return len(header)
+
+    def _replay_journal(self, journal_path):
+        '''
+        Apply the updates in a journal, if it exists and belongs to the loaded file. Only complete
+        records (ending in a newline) are applied, so a torn final record from a crash part-way
+        through an append is ignored. The next append cuts it off (see _append_journal()).
+
+        @param journal_path The path of the journal.
+
+        @throws InvalidMarkovDatabaseFile Raised if a complete record is corrupt.
+        '''
+        import json
+
+        if self._journal_id is None or not os.path.exists(journal_path):
+            return
+
+        with open(journal_path, 'rb') as journal_file:
+            lines = journal_file.read().decode('utf-8', 'replace').split('\n')
+
+        records = []
+        for line in lines[:-1]:                 # The last piece has no newline.
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                if not records:
+                    return          # Not a journal, so nothing was journaled.
+
+                raise InvalidMarkovDatabaseFile('Corrupt record in Markov journal.')
+
+        if not records or not isinstance(records[0], dict) or \
+           records[0].get('journal_id', None) != self._journal_id:
+            return          # Left over from a file that has since been replaced.
+
+        for journal_record in records[1:]:
+            self._extend_source(journal_record['source'])
+            for state, position in journal_record['states']:
+                self._add_state(state, position)
+
+            if self._included_states != journal_record['included_states']:
+                raise OutOfSyncError('Markov journal does not match the database.')
+
+    def _load_file(self, file_path):
+        '''
+        Load a saved database from a specific file. See load().
+        '''
+        # Raise an error if this is an invalid string type.
+        input_validation.valid_string_type(file_path, throw_error=True) 
+
+        if not os.path.exists(file_path):
+            raise ValueError('Path is not valid.')
+
+        if file_path.endswith(_m_stream):
+            self._load_stream(file_path)
+            self._saved_loc = file_path
+            self._journal_id = None
+            self._journal_pending = None
+            return
+
+        if file_path.endswith(_m_snap):
+            import marshal, sys
+            with open(file_path, 'rb') as mdb_file:
+                try:
+                    markov_dict = marshal.load(mdb_file)
+                except (EOFError, ValueError, TypeError):
+                    raise InvalidMarkovDatabaseFile('Markov snapshot is corrupt or was written '+\
+                                                    'by a different version of Python.')
+
+            if not isinstance(markov_dict, dict) or \
+               tuple(markov_dict.get('python_version', ())) != tuple(sys.version_info[:2]):
+                raise InvalidMarkovDatabaseFile('Markov snapshot was written by a different '+\
+                                                'version of Python.')
+        else:
+            # Load the JSON file.
+            import json
+            with open(file_path, 'r') as mdb_file:
+                if file_path.endswith(_m_zip):  # Compressed
+                    import zlib
+                    ddata = zlib.decompress(mdb_file.read())
+                    markov_dict = json.loads(ddata)
+                else:
+                    markov_dict = json.load(mdb_file)
+
+        self._from_dict(markov_dict)
+        self._saved_loc = file_path
+        self._replay_journal(file_path+_m_journal)
+
+        # Snapshots are not journaled, so saving after loading one needs a full save.
+        self._journal_pending = [] if not file_path.endswith(_m_snap) else None
+
+    def _load_stream(self, file_path):
+        '''
+        Load a database written in the streaming format by build_external().
+
+        @param file_path The path of the file to load.
+        @type file_path str
+
+        @throws InvalidMarkovDatabaseFile Raised if the file is incomplete or malformed.
+        '''
+        import json
+        with open(file_path, 'r') as mdb_file:
+            try:
+                header = json.loads(next(mdb_file))
+                source = json.loads(next(mdb_file))
+            except StopIteration:
+                raise InvalidMarkovDatabaseFile('Markov database file is truncated.')
+
+            if header.get('format', None) != 'stream':
+                raise InvalidMarkovDatabaseFile('Markov database file is not in streaming format.')
+
+            self.name = header['name']
+            self._add_source(source)
+            self._state_index = []
+            self._state_delimited = []
+            self._state_positions = []
+            self._state_occurances = []
+
+            position = 0
+            trailer = None
+            for line in mdb_file:
+                record = json.loads(line)
+                if record[0] == 's':
+                    self._state_index.append(record[1])
+                    self._state_delimited.append(record[2])
+                    self._state_positions.append(record[3])
+                    self._state_occurances.append(len(record[3]))
+                elif record[0] == 'p':
+                    self._source_by_state.append(record[1])
+                    position += 1
+                elif record[0] == 'end':
+                    trailer = record[1]
+
+        if trailer is None or position != len(self._source):
+            raise InvalidMarkovDatabaseFile('Markov database file is truncated.')
+
+        self._included_states = trailer['included_states']
+        self._db_generated = True
+
     def _add_source(self, source):
         '''
         Adds a source if no valid source is present.
@@ -424,10 +1042,53 @@ class MarkovDB:
             raise TypeError('Source must be an ordered list or string, given '+\
                             type(source).__name__)
         
-        self._source = cp(source)
-        self._source_by_state = [[] for x in range(0, len(source))]
+        from copy import copy
+        self._source = copy(source)
+        self._source_by_state = []
         self._valid_source = True
 
+    def _random_state_index(self, weighted, max_attempts=100):
+        '''
+        Choose the index of a random state to start a chain from. States containing the delimiter
+        are skipped, since a chain started from one would run across it, unless no other states
+        exist.
+
+        @param weighted If True, choose a random position in the source and then a state at that
+                        position, so states are weighted by their occurances. Otherwise all states
+                        are equally likely.
+        @type weighted bool
+
+        @param max_attempts Number of random draws to reject before falling back to listing the
+                            candidates, which only happens when most states are delimited.
+        @type max_attempts int
+
+        @return Returns the state index.
+        '''
+        choice = self._rng.choice
+        state_delimited = self._state_delimited
+        for ii in range(0, max_attempts):
+            if weighted:
+                position_states = choice(self._source_by_state)
+                if not position_states:
+                    continue        # No states start this close to the end of the source.
+
+                index = choice(position_states)
+            else:
+                index = self._rng.randrange(len(state_delimited))
+
+            if not state_delimited[index]:
+                return index
+
+        if weighted:
+            candidates = [index for position_states in self._source_by_state
+                                for index in position_states]
+        else:
+            candidates = range(0, len(state_delimited))
+
+        undelimited = [index for index in candidates if not state_delimited[index]]
+
+        return choice(undelimited or candidates)
+
     def _get_next_state(self, state):
         '''
         Given a state, randomly choose a next state, drawn randomly from the possible choices.
@@ -451,8 +1112,8 @@ class MarkovDB:
         
         # Choose randomly from among the states starting at the next position (there will likely be
         # one for each state length.
-        if source_pos > len(self._source_by_state) or len(self._source_by_state[source_pos]) < 1:
-            return None
+        if source_pos >= len(self._source_by_state) or len(self._source_by_state[source_pos]) < 1:
+            return (None, None)
         else:                       # Unnecessary but preferred for aesthetic reasons.
             state_index = self._rng.choice(self._source_by_state[source_pos])
             return (self._state_index[state_index], state_index)
@@ -508,6 +1169,20 @@ class MarkovDB:
 
         return self._state_delimited[state_pos]
 
+def _print_elapsed(time_elapsed):
+    '''
+    Print an elapsed time in seconds as hours, minutes and seconds.
+    '''
+    hours = int(time_elapsed/3600); time_elapsed -= hours*3600
+    minutes = int(time_elapsed/60); time_elapsed -= minutes*60
+    seconds = time_elapsed
+    if hours > 0:
+        stdout.write('{:0.0f}h '.format(hours))
+    if minutes > 0:
+        stdout.write('{:0.0f}m '.format(minutes))
+
+    stdout.write('{:02.3f}s\n'.format(seconds))
+
 
 # Exceptions
 class InvalidMarkovStateError(KeyError):
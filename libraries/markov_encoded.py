@@ -0,0 +1,376 @@
+'''
+Integer-encoded Markov chain database for string sources
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+from array import array
+from bisect import bisect_left
+from time import time
+from sys import stdout
+from exception_helper import OutOfSyncError, RandomnessSourceUndefined
+from markov_chain import MarkovDB, InvalidMarkovStateError, InvalidMarkovSourceError, \
+                         MarkovDBNotGeneratedError, _print_elapsed
+
+class EncodedMarkovDB(MarkovDB):
+    '''
+    A MarkovDB for string sources which works on machine integers rather than substrings.
+
+    The source is mapped once to an array of integer codes, one per character. Each state is then
+    identified by a packed integer key, with each character as one digit (its code + 1, so that
+    states of different lengths have different keys) in base len(alphabet) + 1. While generating,
+    the key for each state length at a source position is rolled forward from the key for the
+    previous length, so a substring is only created the first time each state is seen.
+
+    Chains are generated as lists of state indices and only converted to strings at the end, with
+    a single join for get_chain_as_string().
+
+    The _state_* attributes are the same as those of MarkovDB, so saved files are interchangeable
+    between the two classes.
+    '''
+
+    # Methods
+    def __init__(self, name, source=None, min_state_length=1, max_state_length=1,
+                       delimiter=None):
+        '''
+        The constructor for the class. See MarkovDB.__init__().
+
+        @throws TypeError Thrown if source is not a string.
+        '''
+        if source is not None and not isinstance(source, (str, unicode)):
+            raise TypeError('EncodedMarkovDB requires a string source, given '+\
+                            type(source).__name__)
+
+        self._alphabet = []                 # Character for each code.
+        self._code_map = {}                 # Code for each character.
+        self._key_base = 1
+        self._codes = None                  # The source as an array of codes.
+        self._state_ids = {}                # State index for each packed state key.
+        self._state_lengths = array('I')
+
+        MarkovDB.__init__(self, name, source=source,
+                          min_state_length=min_state_length,
+                          max_state_length=max_state_length,
+                          delimiter=delimiter)
+
+    def generate(self, print_progress=False, print_time=False):
+        '''
+        Generates the Markov database from the source by finding each unique state in the source and
+        adding it to the _state_* attributes.
+
+        @param print_progress Print a progress bar as you are going [Default: False]
+        @type print_progress bool
+
+        @param print_time Print the time that the generation took.
+        @type print_time bool
+
+        @throws InvalidMarkovSourceError Thrown when no valid source is present.
+        @throws TypeError Thrown when the source is not a string.
+        '''
+        if not self._valid_source:
+            raise InvalidMarkovSourceError('Valid source must be provided before '+\
+                                           'generating database.')
+
+        if print_time:
+            stime = time()
+
+        self._encode_source()
+
+        source = self._source
+        codes = self._codes
+        base = self._key_base
+        source_len = len(source)
+        min_len = self.min_state_length
+        max_len = self.max_state_length
+        delimiter = self._delimiter
+
+        state_ids = {}
+        state_index = []
+        state_lengths = array('I')
+        state_positions = []
+        state_delimited = []
+        source_by_state = [[] for x in range(0, source_len)]
+
+        if print_progress:
+            prog_step = max(1, source_len//20); char_set = ('[', ']'); csi = 0
+
+        for ii in range(0, source_len):
+            key = 0
+            position_states = source_by_state[ii]
+            for jj in range(1, min(max_len, source_len - ii)+1):
+                key = key*base + codes[ii+jj-1] + 1
+                if jj < min_len:
+                    continue
+
+                state_pos = state_ids.get(key, None)
+                if state_pos is None:
+                    # First time we've seen this state, so now we need the substring.
+                    state = source[ii:ii+jj]
+                    state_pos = len(state_index)
+                    state_ids[key] = state_pos
+                    state_index.append(state)
+                    state_lengths.append(jj)
+                    state_positions.append([])
+                    state_delimited.append(delimiter is not None and delimiter in state)
+
+                state_positions[state_pos].append(ii)
+                position_states.append(state_pos)
+
+                if state_delimited[state_pos]:
+                    break
+
+            if print_progress and ii % prog_step == 0:
+                stdout.write(char_set[csi%2]);    csi += 1
+                stdout.flush()
+
+        if print_progress:
+            if csi%2 == 1:
+                stdout.write(']')
+            stdout.write('\n')
+
+        self._state_ids = state_ids
+        self._state_index = state_index
+        self._state_lengths = state_lengths
+        self._state_positions = state_positions
+        self._state_occurances = [len(positions) for positions in state_positions]
+        self._state_delimited = state_delimited
+        self._source_by_state = source_by_state
+        self._included_states = sum(self._state_occurances)
+
+        if print_time:
+            _print_elapsed(time() - stime)
+
+        self._db_generated = True
+        self._journal_pending = None        # Needs a full save.
+
+    def get_chain(self, num_states,
+                        seed=None, random_seed_weighted=False,
+                        delimiter=None):
+        '''
+        Generate a Markov chain with length num_states. See MarkovDB.get_chain().
+
+        @return Returns a chain of states.
+        '''
+        state_index = self._state_index
+        return [state_index[state_pos] for state_pos in
+                self._get_chain_indices(num_states, seed, random_seed_weighted)]
+
+    def get_chain_as_string(self, num_states,
+                            seed=None, random_seed_weighted=False,
+                            delimiter=None, dedup_filter=None, blocklist=None):
+        '''
+        Generate a Markov chain and concatenate it to a string in one pass. See
+        MarkovDB.get_chain_as_string().
+
+        @return Returns a chain of states as a string.
+        '''
+        if blocklist is not None or dedup_filter is not None:
+            return MarkovDB.get_chain_as_string(self, num_states, seed=seed,
+                                                random_seed_weighted=random_seed_weighted,
+                                                dedup_filter=dedup_filter, blocklist=blocklist)
+
+        state_index = self._state_index
+        return ''.join([state_index[state_pos] for state_pos in
+                        self._get_chain_indices(num_states, seed, random_seed_weighted)])
+
+    # Private methods
+    def _get_chain_indices(self, num_states, seed, random_seed_weighted):
+        '''
+        Generate a Markov chain as a list of state indices.
+
+        @throws ValueError Thrown if num_states is not a positive integer.
+        @throws InvalidMarkovStateError Thrown if seed is not a valid state.
+        @throws MarkovDBNotGeneratedError Thrown if the Markov database has not been generated.
+        '''
+        if num_states < 1:
+            raise ValueError('Number of states must be a positive integer.')
+
+        if not self._valid_source:
+            raise InvalidMarkovStateError('Source must be valid and database generated before ' + \
+                                          'a chain can be generated.')
+
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before a chain ' + \
+                                            'can be generated.')
+
+        if self._rng is None:
+            raise RandomnessSourceUndefined('Randomness source needed for Markov chain '+\
+                                            'generation.')
+
+        choice = self._rng.choice
+        if seed is None:
+            c_state = self._random_state_index(random_seed_weighted)
+        else:
+            c_state = self._state_ids.get(self._state_key(seed), None)
+            if c_state is None:
+                raise InvalidMarkovStateError(repr(seed) + ' is not a valid state.')
+
+        # Bind everything used in the inner loop locally.
+        state_positions = self._state_positions
+        state_lengths = self._state_lengths
+        state_delimited = self._state_delimited
+        source_by_state = self._source_by_state
+        source_len = len(source_by_state)
+
+        chain = [c_state]
+        for ii in range(1, num_states):
+            source_pos = choice(state_positions[c_state]) + state_lengths[c_state]
+
+            # Chain is broken if we reach the end of the source or if we reach a delimiter.
+            if source_pos >= source_len or not source_by_state[source_pos]:
+                break
+
+            c_state = choice(source_by_state[source_pos])
+            if state_delimited[c_state]:
+                break
+
+            chain.append(c_state)
+
+        return chain
+
+    def _get_next_state(self, state):
+        '''
+        Given a state, randomly choose a next state, drawn randomly from the possible choices.
+
+        @param state A valid state.
+
+        @return (state, state_index)
+
+        @throws InvalidMarkovStateError Thrown when an invalid state is passed.
+        '''
+        state_pos = self._state_ids.get(self._state_key(state), None)
+        if state_pos is None:
+            raise InvalidMarkovStateError('State '+repr(state)+' is not in the database.')
+
+        if self._rng is None:
+            raise RandomnessSourceUndefined('Cannot generate Markov chain without '+\
+                                            'randomness source.')
+
+        source_pos = self._rng.choice(self._state_positions[state_pos])
+        source_pos += self._state_lengths[state_pos]
+
+        if source_pos >= len(self._source_by_state) or len(self._source_by_state[source_pos]) < 1:
+            return (None, None)
+        else:
+            state_index = self._rng.choice(self._source_by_state[source_pos])
+            return (self._state_index[state_index], state_index)
+
+    def _add_state(self, state, position):
+        '''
+        Adds a state to the source index, etc. Used when extending the source and replaying
+        journals; generate() fills the _state_* attributes directly.
+
+        @param state A substring of the source.
+        @param position The position of the state in the source.
+
+        @throws OutOfSyncError Raised if somehow the _state_* attributes are out of sync.
+        @throws KeyError Raised if position is invalid in the source.
+
+        @return Returns whether or not the state ends with the delimiter.
+        '''
+        if not 0 <= position < len(self._source):
+            raise KeyError(repr(position)+' is not a valid index to the source.')
+
+        key = self._state_key(state)
+        state_pos = self._state_ids.get(key, None)
+        if state_pos is None:
+            if not (len(self._state_index) == len(self._state_positions) == \
+                    len(self._state_occurances) == len(self._state_delimited) == \
+                    len(self._state_lengths)):
+                raise OutOfSyncError('State attributes don\'t have identical lengths.')
+
+            state_pos = len(self._state_index)
+            self._state_ids[key] = state_pos
+            self._state_index.append(state)
+            self._state_lengths.append(len(state))
+            self._state_positions.append([])
+            self._state_occurances.append(0)
+            self._state_delimited.append(self._delimiter is not None and self._delimiter in state)
+
+        # Positions are kept sorted, so this is the same check as MarkovDB's, in O(log n).
+        positions = self._state_positions[state_pos]
+        ii = bisect_left(positions, position)
+        if ii == len(positions) or positions[ii] != position:
+            positions.insert(ii, position)
+            self._state_occurances[state_pos] += 1
+            self._included_states += 1
+
+        if state_pos not in self._source_by_state[position]:
+            self._source_by_state[position].append(state_pos)
+
+        return self._state_delimited[state_pos]
+
+    def _from_dict(self, markov_dict):
+        '''
+        Restore the database from a dictionary, then rebuild the integer lookups.
+        '''
+        MarkovDB._from_dict(self, markov_dict)
+        if self._valid_source:
+            self._build_lookup()
+
+    def _load_stream(self, file_path):
+        '''
+        Load a database in the streaming format, then rebuild the integer lookups.
+        '''
+        MarkovDB._load_stream(self, file_path)
+        self._build_lookup()
+
+    def _extend_source(self, source):
+        '''
+        Append to the source and its codes. If the new part has characters not already in the
+        alphabet the keys change, so the lookups are rebuilt.
+        '''
+        old_len = len(self._source)
+        MarkovDB._extend_source(self, source)
+
+        if self._codes is None:
+            return                          # Not encoded yet, generate() will do it.
+
+        code_map = self._code_map
+        if all(ch in code_map for ch in source):
+            self._codes.extend(code_map[ch] for ch in self._source[old_len:])
+        else:
+            self._build_lookup()
+
+    def _encode_source(self):
+        '''
+        Map the source to an array of integer codes.
+
+        @throws TypeError Thrown when the source is not a string.
+        '''
+        if not isinstance(self._source, (str, unicode)):
+            raise TypeError('EncodedMarkovDB requires a string source, given '+\
+                            type(self._source).__name__)
+
+        alphabet = sorted(set(self._source))
+        self._alphabet = alphabet
+        self._code_map = dict((ch, code) for code, ch in enumerate(alphabet))
+        self._key_base = len(alphabet) + 1
+        self._codes = array('H' if len(alphabet) <= 0x10000 else 'L',
+                            [self._code_map[ch] for ch in self._source])
+
+    def _build_lookup(self):
+        '''
+        Encode the source and rebuild the key and length lookups from the _state_* attributes,
+        e.g. after loading.
+        '''
+        self._encode_source()
+        self._state_ids = dict((self._state_key(state), state_pos)
+                               for state_pos, state in enumerate(self._state_index))
+        self._state_lengths = array('I', [len(state) for state in self._state_index])
+
+    def _state_key(self, state):
+        '''
+        The packed integer key of a state, or None if it contains characters which are not in
+        the source.
+        '''
+        code_map = self._code_map
+        base = self._key_base
+        key = 0
+        try:
+            for ch in state:
+                key = key*base + code_map[ch] + 1
+        except (KeyError, TypeError):
+            return None
+
+        return key
@@ -0,0 +1,379 @@
+'''
+Library for word-level Markov passphrase generation
+
+Words are interned to integer ids when the database is generated and the transition tables are
+built over those ids, so generating a passphrase is only integer lookups followed by a single join.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import json, os, random, zlib
+from math import log
+import input_validation
+from exception_helper import FileExists, RandomnessSourceUndefined
+from settings_helper import get_markov_save_location
+from markov_chain import InvalidMarkovSourceError, MarkovDBNotGeneratedError, \
+                         InvalidMarkovDatabaseFile
+
+_p_zip = '.pjson.gz'        # Compressed passphrase JSON.
+
+class PassphraseDB:
+    '''
+    A word-level Markov chain database for generating passphrases.
+
+    The source is a sequence of words (a string is split on whitespace). Each word is assigned an
+    integer id, and for each context of `order` consecutive word ids a tuple of all the ids that
+    follow it in the source is precomputed, so that choosing uniformly from that tuple draws the
+    next word with the frequency it has in the source.
+
+    The source is treated as circular: the contexts which would run past the end of the source
+    wrap around to its start. This adds `order` transitions which are not in the source, from the
+    words at the end to those at the start (for 'a b c' with order 1, 'c' is followed by 'a'),
+    and for order > 1 it adds contexts spanning the join. In exchange every context has at least
+    one successor, so chains never dead-end, and every source position is an equally likely start.
+    For sources much longer than the order, the synthetic transitions are a negligible fraction of
+    the total.
+    '''
+
+    __db_version__ = 0.1                        # Include for future compatibility.
+
+    # Methods
+    def __init__(self, name, source=None, order=1):
+        '''
+        The constructor for the class.
+
+        @param name The name of the database. This will be used for file saving, so special
+                    characters are not allowed.
+        @type name str
+
+        @param source The words to be used in the Markov chain. Strings are split on whitespace.
+        @type source (str, unicode, list, tuple)
+
+        @param order The number of preceding words used to choose the next word.
+        @type order int
+
+        @throws TypeError Thrown if an invalid type is passed to one of the arguments.
+        @throws ValueError Thrown if an invalid value is passed to one of the arguments.
+        '''
+        # Validate the inputs
+        input_validation.valid_name(name, throw_error=True)
+
+        if order < 1:
+            raise ValueError('order must be a positive integer.')
+
+        # Basic values
+        self._source = None
+        self._words = []                # Word for each word id.
+        self._word_ids = {}             # Word id for each word.
+        self._codes = []                # The source as word ids.
+        self._transitions = {}          # Tuple of following word ids for each context.
+        self._contexts = []             # Context starting at each source position.
+        self._valid_source = False
+        self._db_generated = False
+        self._rng = random.SystemRandom()
+        self._saved_loc = None
+
+        # Construct the object
+        self.name = name
+        self.order = order
+        if source is not None:
+            self._add_source(source)
+
+    def generate(self):
+        '''
+        Intern the words in the source and build the transition tables.
+
+        @throws InvalidMarkovSourceError Thrown when no valid source is present.
+        '''
+        if not self._valid_source:
+            raise InvalidMarkovSourceError('Valid source must be provided before '+\
+                                           'generating database.')
+
+        self._words = []
+        self._word_ids = {}
+        codes = []
+        for word in self._source:
+            input_validation.valid_string_type(word, throw_error=True)
+
+            if word not in self._word_ids:
+                self._word_ids[word] = len(self._words)
+                self._words.append(word)
+
+            codes.append(self._word_ids[word])
+
+        self._codes = codes
+        self._build_tables()
+        self._db_generated = True
+
+    def save(self, save_location=None, overwrite=True):
+        '''
+        Save the database to a compressed file. Only the word list and the source as word ids are
+        stored; the transition tables are rebuilt on load.
+
+        @param save_location The directory into which the file should be saved. [Default: None]
+        @type save_location str
+
+        @param overwrite Whether to overwrite an existing file. [Default: True]
+        @type overwrite bool
+
+        @throws MarkovDBNotGeneratedError Raised when the database has not been generated.
+        @throws FileExists Raised if overwrite is False and the file already exists.
+        '''
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before saving.')
+
+        if save_location is None:
+            if self._saved_loc is not None and os.path.exists(self._saved_loc):
+                save_location = os.path.dirname(self._saved_loc)
+            else:
+                save_location = get_markov_save_location()
+
+        save_file_path = os.path.join(save_location, self.name+_p_zip)
+        if not overwrite and os.path.exists(save_file_path):
+            raise FileExists('Markov database file '+self.name+_p_zip+' already exists.')
+
+        markov_dict = dict()
+        markov_dict['version'] = self.__db_version__
+        markov_dict['name'] = self.name
+        markov_dict['order'] = self.order
+        markov_dict['words'] = self._words
+        markov_dict['codes'] = self._codes
+
+        if not os.path.exists(os.path.dirname(save_file_path)):
+            os.makedirs(os.path.dirname(save_file_path))
+
+        with open(save_file_path, 'wb') as save_file:
+            save_file.write(zlib.compress(json.dumps(markov_dict, separators=(',', ':'))))
+
+        self._saved_loc = save_file_path
+
+    def load(self, file_path=None):
+        '''
+        Load a saved database from file.
+
+        @param file_path The path of the file to load. If None, this will be generated from the
+                         default save location and the name passed to the constructor.
+        @type file_path str
+
+        @throws ValueError Raised when an invalid path is passed to file_path
+        @throws InvalidMarkovDatabaseFile Raised when the file is malformed.
+        '''
+        if file_path is None:
+            if self._saved_loc is not None and os.path.exists(self._saved_loc):
+                file_path = self._saved_loc
+            else:
+                file_path = os.path.join(get_markov_save_location(), self.name+_p_zip)
+
+        input_validation.valid_string_type(file_path, throw_error=True)
+
+        if not os.path.exists(file_path):
+            raise ValueError('Path is not valid.')
+
+        with open(file_path, 'rb') as mdb_file:
+            markov_dict = json.loads(zlib.decompress(mdb_file.read()))
+
+        try:
+            self.name = markov_dict['name']
+            self.order = markov_dict['order']
+            self._words = markov_dict['words']
+            self._codes = markov_dict['codes']
+        except KeyError as ke:
+            raise InvalidMarkovDatabaseFile('Error reading Markov file key '+ke.args[0], ke=ke)
+
+        self._word_ids = dict((word, ii) for ii, word in enumerate(self._words))
+        self._build_tables()
+        self._valid_source = False
+        self._db_generated = True
+        self._saved_loc = file_path
+
+    def get_passphrase(self, num_words, separator=' ', dedup_filter=None, blocklist=None):
+        '''
+        Generate a single passphrase.
+
+        @param num_words Number of words in the passphrase.
+        @type num_words int
+
+        @param separator String placed between the words. [Default: ' ']
+        @type separator str
+
+        @param dedup_filter If specified, passphrases already in this filter are regenerated, and
+                            the returned passphrase is added to it. [Default: None]
+        @type dedup_filter bloom_filter.BloomFilter
+
+        @param blocklist If specified, passphrases in this blocklist are rejected and regenerated.
+                         [Default: None]
+        @type blocklist blocklist.Blocklist
+
+        @return Returns the passphrase as a string.
+
+        @throws ValueError Thrown if num_words is not a positive integer.
+        @throws MarkovDBNotGeneratedError Thrown if the database has not been generated.
+        @throws DuplicateLimitError Thrown if no unique passphrase could be generated.
+        @throws BlocklistLimitError Thrown if no passphrase outside the blocklist could be generated.
+        '''
+        return next(self.get_passphrases(1, num_words, separator=separator,
+                                         dedup_filter=dedup_filter, blocklist=blocklist))
+
+    def get_passphrases(self, count, num_words, separator=' ', dedup_filter=None,
+                              blocklist=None):
+        '''
+        Generate a number of passphrases. This is the fast path for bulk generation, the per-word
+        loop only does tuple indexing and dictionary lookups on integers.
+
+        @param count Number of passphrases to generate.
+        @type count int
+
+        @param num_words Number of words in each passphrase.
+        @type num_words int
+
+        @param separator String placed between the words. [Default: ' ']
+        @type separator str
+
+        @param dedup_filter If specified, passphrases already in this filter are regenerated, and
+                            each returned passphrase is added to it. [Default: None]
+        @type dedup_filter bloom_filter.BloomFilter
+
+        @param blocklist If specified, passphrases in this blocklist are rejected and regenerated.
+                         [Default: None]
+        @type blocklist blocklist.Blocklist
+
+        @return Yields passphrases as strings.
+
+        @throws ValueError Thrown if num_words is not a positive integer.
+        @throws MarkovDBNotGeneratedError Thrown if the database has not been generated.
+        @throws DuplicateLimitError Thrown if no unique passphrase could be generated.
+        @throws BlocklistLimitError Thrown if no passphrase outside the blocklist could be generated.
+        '''
+        if num_words < 1:
+            raise ValueError('Number of words must be a positive integer.')
+
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before a chain ' + \
+                                            'can be generated.')
+
+        if self._rng is None:
+            raise RandomnessSourceUndefined('Randomness source needed for Markov chain '+\
+                                            'generation.')
+
+        # Bind everything used in the inner loop locally.
+        choice = self._rng.choice
+        transitions = self._transitions
+        contexts = self._contexts
+        words = self._words
+        join = separator.join
+        order = self.order
+
+        def make_passphrase():
+            context = choice(contexts)
+            if order == 1:
+                codes = [context]
+                for jj in range(1, num_words):
+                    context = choice(transitions[context])
+                    codes.append(context)
+            else:
+                codes = list(context)
+                for jj in range(order, num_words):
+                    code = choice(transitions[context])
+                    codes.append(code)
+                    context = context[1:] + (code,)
+
+                codes = codes[:num_words]
+
+            return join([words[code] for code in codes])
+
+        for ii in range(0, count):
+            if blocklist is not None:
+                yield blocklist.allowed(make_passphrase, dedup_filter=dedup_filter)
+            elif dedup_filter is not None:
+                yield dedup_filter.unique(make_passphrase)
+            else:
+                yield make_passphrase()
+
+    def entropy(self, num_words):
+        '''
+        The average entropy of a passphrase with a given number of words, in bits, assuming the
+        starting context is chosen uniformly from the source positions. Repeated successors are
+        counted with their multiplicity. Passphrases shorter than the order are the first words of
+        a starting context, so only those words count towards the start.
+
+        @param num_words Number of words in the passphrase.
+        @type num_words int
+
+        @return Returns the estimated entropy in bits.
+
+        @throws MarkovDBNotGeneratedError Thrown if the database has not been generated.
+        '''
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before its ' + \
+                                            'entropy can be calculated.')
+
+        # Mean per-transition entropy, weighted by how often each context occurs in the source,
+        # which is the number of successors recorded for it.
+        transition_entropy = 0.0
+        for successors in self._transitions.values():
+            counts = {}
+            for code in successors:
+                counts[code] = counts.get(code, 0) + 1
+
+            n = float(len(successors))
+            transition_entropy -= n*sum((c/n)*log(c/n, 2) for c in counts.values())
+
+        transition_entropy /= len(self._contexts)
+
+        # The starting context is drawn from the source positions, so it is distributed with the
+        # frequency of each context rather than uniformly over the distinct contexts. When fewer
+        # words than the order are used, contexts which share those words can't be told apart.
+        if num_words < self.order:
+            starts = {}
+            for context in self._contexts:
+                starts[context[:num_words]] = starts.get(context[:num_words], 0) + 1
+
+            start_counts = starts.values()
+        else:
+            start_counts = [len(successors) for successors in self._transitions.values()]
+
+        n = float(len(self._contexts))
+        start_entropy = -sum((c/n)*log(c/n, 2) for c in start_counts)
+        return start_entropy + max(0, num_words - self.order)*transition_entropy
+
+    # Private methods
+    def _add_source(self, source):
+        '''
+        Adds a source.
+
+        @param source A string of whitespace-separated words or a list of words.
+        @type source (str, unicode, list, tuple)
+        '''
+        if isinstance(source, (str, unicode)):
+            source = source.split()
+
+        if not isinstance(source, (list, tuple)):
+            raise TypeError('Source must be a list of words or a string, given '+\
+                            type(source).__name__)
+
+        if len(source) < self.order + 1:
+            raise ValueError('Source must contain more words than the order of the chain.')
+
+        self._source = source
+        self._valid_source = True
+
+    def _build_tables(self):
+        '''
+        Build the context and transition tables from the word id source.
+        '''
+        codes = self._codes
+        n = len(codes)
+        order = self.order
+
+        if order == 1:
+            contexts = list(codes)
+        else:
+            contexts = [tuple(codes[(ii+kk) % n] for kk in range(0, order)) for ii in range(0, n)]
+
+        transitions = {}
+        for ii in range(0, n):
+            transitions.setdefault(contexts[ii], []).append(codes[(ii+order) % n])
+
+        self._contexts = contexts
+        self._transitions = dict((context, tuple(successors))
+                                 for context, successors in transitions.items())
@@ -26,6 +26,8 @@ class SettingsHelper:
 	version_key = 'version'
 	markov_source_loc_key = 'markov_source_loc'
 
+_value_cache = {}			# Parsed setting values, by (settings file, key)
+
 class SettingsReader:
 	'''
 	Read-only access to the settings file.
@@ -180,6 +182,38 @@ class SettingsWriter(SettingsReader):
 				      indent=4, 						# Pretty print
 				      separators=(',', ': '))			# No trailing whitespace
 
+		_value_cache.clear()
+
+def get_cached_value(key, file_loc=SettingsHelper.settings_loc):
+	'''
+	Retrieve the parsed value of a setting, reading the settings file only the first time each
+	setting is requested. The cache is cleared whenever settings are written.
+
+	@param key The name of the setting.
+	@type key str
+
+	@param file_loc The settings file to read from.
+	@type file_loc str
+
+	@return Returns the value of the setting.
+
+	@throws InvalidSettingError Thrown if an invalid setting is requested.
+	'''
+	cache_key = (file_loc, key)
+	if cache_key not in _value_cache:
+		_value_cache[cache_key] = SettingsReader(file_loc=file_loc).getValue(key)
+
+	return _value_cache[cache_key]
+
+def get_markov_save_location():
+	'''
+	The default directory for saved Markov databases. The settings file is only read the first
+	time this is called (see get_cached_value()).
+
+	@return Returns the path of the directory.
+	'''
+	return get_cached_value(SettingsHelper.markov_source_loc_key)
+
 def restore_default_settings():
 	'''
 	Restores the default settings.
@@ -191,6 +225,7 @@ def restore_default_settings():
 		generate_default_settings_file()
 
 	copyfile(SettingsHelper.default_settings_loc, SettingsHelper.settings_loc)
+	_value_cache.clear()
 
 
 def generate_default_settings_file(file_loc=SettingsHelper.default_settings_loc):
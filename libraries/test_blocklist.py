@@ -0,0 +1,98 @@
+'''
+Tests for the blocklist index.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, shutil, struct, tempfile, unittest
+from blocklist import Blocklist, build_blocklist, password_hash, InvalidBlocklistFile, \
+					  BlocklistLimitError
+
+class BlocklistTests(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		self.wordlist_path = os.path.join(self.temp_dir, 'wordlist.txt')
+		self.index_path = os.path.join(self.temp_dir, 'blocklist.idx')
+
+		self.passwords = ['password{}'.format(ii) for ii in range(0, 5000)]
+		with open(self.wordlist_path, 'wb') as wordlist:
+			# Duplicates, blank lines and Windows line endings should all be handled.
+			for password in self.passwords + self.passwords[:100]:
+				wordlist.write(password.encode('utf-8') + b'\r\n')
+			wordlist.write(b'\n')
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_membership(self):
+		count = build_blocklist(self.wordlist_path, self.index_path, memory_limit=4096,
+								temp_dir=self.temp_dir)
+		self.assertEqual(count, len(self.passwords))
+
+		with Blocklist(self.index_path) as blocklist:
+			self.assertEqual(len(blocklist), len(self.passwords))
+			for password in self.passwords:
+				self.assertTrue(password in blocklist)
+
+			for ii in range(0, 5000):
+				self.assertFalse('not a password {}'.format(ii) in blocklist)
+
+			self.assertFalse('' in blocklist)
+
+	def test_index_is_sorted(self):
+		build_blocklist(self.wordlist_path, self.index_path, memory_limit=4096)
+		with open(self.index_path, 'rb') as index_file:
+			index_file.seek(16)
+			data = index_file.read()
+
+		hashes = sorted(set(password_hash(password) for password in self.passwords))
+		self.assertEqual(list(struct.unpack('>{}Q'.format(len(data)//8), data)), hashes)
+
+	def test_rebuild_replaces_index(self):
+		build_blocklist(self.wordlist_path, self.index_path)
+		with Blocklist(self.index_path) as old_blocklist:
+			with open(self.wordlist_path, 'wb') as wordlist:
+				wordlist.write(b'hunter2\n')
+
+			self.assertEqual(build_blocklist(self.wordlist_path, self.index_path), 1)
+
+			# The open index still sees the file it opened.
+			self.assertTrue(self.passwords[0] in old_blocklist)
+
+		with Blocklist(self.index_path) as blocklist:
+			self.assertTrue('hunter2' in blocklist)
+			self.assertFalse(self.passwords[0] in blocklist)
+
+		self.assertFalse(os.path.exists(self.index_path + '.tmp'))
+
+	def test_failed_build_leaves_no_temporary_file(self):
+		self.assertRaises(IOError, build_blocklist, os.path.join(self.temp_dir, 'missing.txt'),
+						  self.index_path)
+		self.assertFalse(os.path.exists(self.index_path))
+		self.assertFalse(os.path.exists(self.index_path + '.tmp'))
+
+	def test_invalid_file(self):
+		with open(self.index_path, 'wb') as index_file:
+			index_file.write(b'PPBLOCK1')
+
+		self.assertRaises(InvalidBlocklistFile, Blocklist, self.index_path)
+
+		with open(self.index_path, 'wb') as index_file:
+			index_file.write(b'NOTBLOCK' + b'\x00'*8)
+
+		self.assertRaises(InvalidBlocklistFile, Blocklist, self.index_path)
+
+	def test_allowed(self):
+		build_blocklist(self.wordlist_path, self.index_path)
+		with Blocklist(self.index_path) as blocklist:
+			candidates = iter(self.passwords[:10] + ['hunter2'])
+			self.assertEqual(blocklist.allowed(lambda: next(candidates)), 'hunter2')
+			self.assertEqual(blocklist.rejected, 10)
+
+			self.assertRaises(BlocklistLimitError, blocklist.allowed,
+							  lambda: self.passwords[0], max_attempts=5)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,132 @@
+'''
+Tests for the Bloom filter.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, shutil, tempfile, unittest
+from bloom_filter import BloomFilter, DuplicateLimitError, InvalidBloomFilterFile
+
+class BloomFilterTests(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_no_false_negatives(self):
+		bloom = BloomFilter(capacity=5000, error_rate=0.01)
+		items = ['item{}'.format(ii) for ii in range(0, 5000)]
+		for item in items:
+			bloom.add(item)
+
+		for item in items:
+			self.assertTrue(item in bloom)
+
+	def test_false_positive_rate(self):
+		for error_rate in (0.01, 0.001):
+			bloom = BloomFilter(capacity=20000, error_rate=error_rate)
+			for ii in range(0, 20000):
+				bloom.add('item{}'.format(ii))
+
+			false_positives = sum(1 for ii in range(0, 100000) if 'other{}'.format(ii) in bloom)
+			self.assertTrue(false_positives/100000.0 < 2*error_rate)
+			self.assertTrue(abs(bloom.estimated_error_rate - error_rate) < error_rate/2)
+
+	def test_max_bytes(self):
+		# The capacity is cut to what fits in the budget at the requested error rate.
+		bloom = BloomFilter(capacity=10**6, max_bytes=1024)
+		self.assertEqual(bloom.size_bytes, 1024)
+		self.assertTrue(560 < bloom.capacity < 590)
+
+		for ii in range(0, bloom.capacity):
+			bloom.add('item{}'.format(ii))
+
+		self.assertTrue(bloom.estimated_error_rate < 1.1*bloom.error_rate)
+
+		bloom = BloomFilter(capacity=100, max_bytes=1024)
+		self.assertEqual(bloom.capacity, 100)
+		self.assertTrue(bloom.size_bytes < 1024)
+
+		bloom = BloomFilter(max_bytes=1024, error_rate=0.01)
+		self.assertEqual(bloom.size_bytes, 1024)
+		self.assertTrue(850 < bloom.capacity < 880)
+
+	def test_duplicate_counting(self):
+		bloom = BloomFilter(capacity=100)
+		self.assertFalse(bloom.add('a'))
+		self.assertTrue(bloom.add('a'))
+		self.assertFalse(bloom.add(u'\u00e9'))
+
+		self.assertEqual(len(bloom), 2)
+		self.assertEqual(bloom.checked, 3)
+		self.assertEqual(bloom.duplicates, 1)
+		self.assertAlmostEqual(bloom.duplicate_rate, 1/3.0)
+
+	def test_unique(self):
+		bloom = BloomFilter(capacity=100)
+		candidates = iter(['a', 'a', 'b'])
+		bloom.add('a')
+		self.assertEqual(bloom.unique(lambda: next(candidates)), 'b')
+
+		self.assertRaises(DuplicateLimitError, bloom.unique, lambda: 'a', max_attempts=3)
+
+	def test_save_load(self):
+		bloom = BloomFilter(capacity=1000, error_rate=0.01)
+		for ii in range(0, 500):
+			bloom.add('item{}'.format(ii))
+
+		file_path = os.path.join(self.temp_dir, 'filter.bf')
+		bloom.save(file_path)
+		loaded = BloomFilter.load(file_path)
+
+		self.assertEqual(loaded._bits, bloom._bits)
+		self.assertEqual((loaded.capacity, loaded.count, loaded.checked, loaded.duplicates),
+						 (bloom.capacity, bloom.count, bloom.checked, bloom.duplicates))
+		self.assertTrue(loaded.add('item0'))
+
+	def test_save_replaces(self):
+		file_path = os.path.join(self.temp_dir, 'filter.bf')
+		BloomFilter(capacity=1000).save(file_path)
+
+		bloom = BloomFilter(capacity=50)
+		bloom.add('a')
+		bloom.save(file_path)
+
+		self.assertEqual(os.listdir(self.temp_dir), ['filter.bf'])
+		self.assertEqual(BloomFilter.load(file_path).capacity, 50)
+
+	def test_load_uses_saved_size(self):
+		# The bit array comes from the file, whatever the capacity in the header.
+		file_path = os.path.join(self.temp_dir, 'filter.bf')
+		with open(file_path, 'wb') as bloom_file:
+			bloom_file.write(b'{"format": "BLOOM", "capacity": 1000000000000, "error_rate": 0.001, '
+							 b'"num_bits": 64, "num_hashes": 3, "count": 0, "checked": 0, '
+							 b'"duplicates": 0}\n' + b'\0'*8)
+
+		bloom = BloomFilter.load(file_path)
+		self.assertEqual(bloom.size_bytes, 8)
+		self.assertFalse(bloom.add('a'))
+		self.assertTrue('a' in bloom)
+
+	def test_invalid_file(self):
+		file_path = os.path.join(self.temp_dir, 'filter.bf')
+		with open(file_path, 'wb') as bloom_file:
+			bloom_file.write(b'not a filter\n')
+
+		self.assertRaises(InvalidBloomFilterFile, BloomFilter.load, file_path)
+
+		bloom = BloomFilter(capacity=1000)
+		bloom.save(file_path)
+		with open(file_path, 'rb') as bloom_file:
+			data = bloom_file.read()
+
+		with open(file_path, 'wb') as bloom_file:
+			bloom_file.write(data[:-10])
+
+		self.assertRaises(InvalidBloomFilterFile, BloomFilter.load, file_path)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,144 @@
+'''
+Tests for the external sort and the out-of-core Markov database build.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, random, shutil, tempfile, unittest
+from external_sort import external_sort, external_sort_uint64
+from markov_chain import MarkovDB
+
+class ExternalSortTests(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		rng = random.Random(0)
+		self.records = [(rng.choice(['a', 'b', 'ab', 'ba']), rng.randint(0, 100), [rng.randint(0, 3)])
+						for ii in range(0, 2000)]
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_in_memory(self):
+		self.assertEqual(list(external_sort(self.records, temp_dir=self.temp_dir)),
+						 sorted(self.records))
+		self.assertEqual(os.listdir(self.temp_dir), [])
+
+	def test_spilled_runs(self):
+		self.assertEqual(list(external_sort(self.records, memory_limit=4096,
+											temp_dir=self.temp_dir)),
+						 sorted(self.records))
+		self.assertEqual(os.listdir(self.temp_dir), [])
+
+	def test_multi_pass_merge(self):
+		self.assertEqual(list(external_sort(self.records, memory_limit=4096,
+											temp_dir=self.temp_dir, max_open_runs=2)),
+						 sorted(self.records))
+
+	def test_invalid_arguments(self):
+		# Bad arguments are reported when the sort is set up, not when it is first read.
+		self.assertRaises(ValueError, external_sort, self.records, memory_limit=0)
+		self.assertRaises(ValueError, external_sort, self.records, max_open_runs=1)
+		self.assertRaises(ValueError, external_sort_uint64, [], memory_limit=0)
+		self.assertRaises(ValueError, external_sort_uint64, [], max_open_runs=1)
+
+	def test_closed_early(self):
+		sorter = external_sort(self.records, memory_limit=4096, temp_dir=self.temp_dir)
+		next(sorter)
+		sorter.close()
+		self.assertEqual(os.listdir(self.temp_dir), [])
+
+class ExternalSortUint64Tests(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		rng = random.Random(2)
+		self.values = [rng.getrandbits(64) for ii in range(0, 20000)] + [0, 2**64 - 1]*3
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def test_in_memory(self):
+		self.assertEqual(list(external_sort_uint64(self.values)), sorted(self.values))
+
+	def test_spilled_runs(self):
+		self.assertEqual(list(external_sort_uint64(self.values, memory_limit=16384,
+												   temp_dir=self.temp_dir, max_open_runs=4)),
+						 sorted(self.values))
+		self.assertEqual(os.listdir(self.temp_dir), [])
+
+class BuildExternalTests(unittest.TestCase):
+	def setUp(self):
+		self.temp_dir = tempfile.mkdtemp()
+		rng = random.Random(1)
+		self.text = ''.join(rng.choice('abc de\n') for ii in range(0, 2000))
+		self.numbers = [rng.randint(0, 5) for ii in range(0, 1000)]
+
+	def tearDown(self):
+		shutil.rmtree(self.temp_dir)
+
+	def assertBuildsMatch(self, source, delimiter=None, pieces=None):
+		generated = MarkovDB('generated', source, 1, 3, delimiter=delimiter)
+		generated.generate()
+
+		if pieces is None:
+			external = MarkovDB('external', source, 1, 3, delimiter=delimiter)
+		else:
+			external = MarkovDB('external', None, 1, 3, delimiter=delimiter)
+
+		file_path = external.build_external(self.temp_dir, memory_limit=4096,
+											temp_dir=self.temp_dir, source=pieces)
+		loaded = MarkovDB('loaded')
+		loaded.load(file_path)
+
+		# The build never needs the states at each position in memory.
+		self.assertEqual(external._source_by_state, [])
+
+		self.assertEqual(loaded._source, source)
+		self.assertEqual([list(state) for state in loaded._state_index],
+						 [list(state) for state in generated._state_index])
+		self.assertEqual(loaded._state_positions, generated._state_positions)
+		self.assertEqual(loaded._state_occurances, generated._state_occurances)
+		self.assertEqual(loaded._state_delimited, generated._state_delimited)
+		self.assertEqual(loaded._source_by_state, generated._source_by_state)
+		self.assertEqual(loaded._included_states, generated._included_states)
+
+	def test_string_source(self):
+		self.assertBuildsMatch(self.text)
+
+	def test_string_source_delimited(self):
+		self.assertBuildsMatch(self.text, delimiter='\n')
+
+	def test_list_source(self):
+		self.assertBuildsMatch(self.numbers)
+
+	def test_list_source_delimited(self):
+		self.assertBuildsMatch(self.numbers, delimiter=3)
+
+	def split(self, source):
+		# Pieces of varying length, including ones shorter than a state.
+		rng = random.Random(6)
+		pieces = []
+		ii = 0
+		while ii < len(source):
+			length = rng.choice([1, 2, 5, 100])
+			pieces.append(source[ii:ii+length])
+			ii += length
+
+		return iter(pieces)
+
+	def test_string_pieces(self):
+		self.assertBuildsMatch(self.text, delimiter='\n', pieces=self.split(self.text))
+
+	def test_list_pieces(self):
+		self.assertBuildsMatch(self.numbers, pieces=self.split(self.numbers))
+
+	def test_empty_source(self):
+		external = MarkovDB('external', None, 1, 3)
+		loaded = MarkovDB('loaded')
+		loaded.load(external.build_external(self.temp_dir, source=iter([])))
+
+		self.assertEqual((loaded._source, loaded._state_index), ('', []))
+
+if __name__ == '__main__':
+	unittest.main()
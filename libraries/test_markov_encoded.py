@@ -0,0 +1,109 @@
+'''
+Tests for the integer-encoded Markov database.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import random, shutil, tempfile, unittest
+from markov_chain import MarkovDB, InvalidMarkovStateError
+from markov_encoded import EncodedMarkovDB
+
+class EncodedMarkovDBTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(5)
+        self.source = u''.join(rng.choice(u'abcde \n\u00e9') for ii in range(0, 3000))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assertSameDatabase(self, mdb, expected):
+        self.assertEqual(mdb._state_index, expected._state_index)
+        self.assertEqual(mdb._state_positions, expected._state_positions)
+        self.assertEqual(mdb._state_occurances, expected._state_occurances)
+        self.assertEqual(mdb._state_delimited, expected._state_delimited)
+        self.assertEqual(mdb._source_by_state, expected._source_by_state)
+        self.assertEqual(mdb._included_states, expected._included_states)
+
+    def test_generate_matches(self):
+        for kwargs in (dict(min_state_length=1, max_state_length=1),
+                       dict(min_state_length=1, max_state_length=4),
+                       dict(min_state_length=2, max_state_length=3, delimiter=u'\n')):
+            expected = MarkovDB('plain', self.source, **kwargs)
+            expected.generate()
+
+            encoded = EncodedMarkovDB('encoded', self.source, **kwargs)
+            encoded.generate()
+
+            self.assertSameDatabase(encoded, expected)
+
+    def test_chains_follow_source(self):
+        encoded = EncodedMarkovDB('encoded', self.source, 1, 3, delimiter=u'\n')
+        encoded.generate()
+
+        for ii in range(0, 200):
+            chain = encoded.get_chain(8)
+            for state, next_state in zip(chain, chain[1:]):
+                # Each state must be followed by the next somewhere in the source.
+                self.assertTrue(state + next_state in self.source)
+                self.assertFalse(u'\n' in next_state)
+
+            self.assertEqual(encoded.get_chain_as_string(8, seed=chain[0])[:len(chain[0])],
+                             chain[0])
+
+    def test_random_seeds_not_delimited(self):
+        for db_class in (MarkovDB, EncodedMarkovDB):
+            mdb = db_class('seeds', self.source, 2, 3, delimiter=u'\n')
+            mdb.generate()
+
+            for weighted in (False, True):
+                for ii in range(0, 300):
+                    chain = mdb.get_chain(1, random_seed_weighted=weighted)
+                    self.assertFalse(u'\n' in chain[0])
+
+            # With nothing else to choose from, delimited states are still used.
+            mdb = db_class('seeds', u'\n\n\n', 1, 2, delimiter=u'\n')
+            mdb.generate()
+            for weighted in (False, True):
+                self.assertTrue(mdb.get_chain_as_string(3, random_seed_weighted=weighted)
+                                in (u'\n', u'\n\n'))
+
+    def test_invalid_seed(self):
+        encoded = EncodedMarkovDB('encoded', self.source, 1, 2)
+        encoded.generate()
+
+        self.assertRaises(InvalidMarkovStateError, encoded.get_chain, 5, seed=u'zz')
+        self.assertRaises(InvalidMarkovStateError, encoded.get_chain, 5, seed=u'abc')
+
+    def test_string_source_required(self):
+        self.assertRaises(TypeError, EncodedMarkovDB, 'encoded', [1, 2, 3])
+
+    def test_files_interchangeable(self):
+        encoded = EncodedMarkovDB('encoded', self.source, 1, 3)
+        encoded.generate()
+        encoded.save(self.temp_dir)
+
+        plain = MarkovDB('encoded')
+        plain.load(encoded._saved_loc)
+        self.assertSameDatabase(plain, encoded)
+
+        reloaded = EncodedMarkovDB('encoded')
+        reloaded.load(encoded._saved_loc)
+        self.assertSameDatabase(reloaded, encoded)
+        self.assertEqual(len(reloaded.get_chain(5, seed=encoded._state_index[0])[0]),
+                         len(encoded._state_index[0]))
+
+    def test_build_external_matches(self):
+        encoded = EncodedMarkovDB('encoded', self.source, 1, 3)
+        encoded.generate()
+
+        external = EncodedMarkovDB('external', self.source, 1, 3)
+        loaded = EncodedMarkovDB('external')
+        loaded.load(external.build_external(self.temp_dir, memory_limit=4096,
+                                            temp_dir=self.temp_dir))
+        self.assertSameDatabase(loaded, encoded)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+'''
+Tests for incremental Markov database updates and their journal.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import os, random, shutil, tempfile, unittest
+from markov_chain import MarkovDB
+from markov_encoded import EncodedMarkovDB
+
+def canonical(mdb):
+    '''
+    The database in a form that does not depend on the order in which states were added: the
+    positions of each state, and the states starting at each position.
+    '''
+    states = [tuple(state) for state in mdb._state_index]
+    positions = dict((state, sorted(mdb._state_positions[ii]))
+                     for ii, state in enumerate(states))
+    by_position = [sorted(states[ii] for ii in position_states)
+                   for position_states in mdb._source_by_state]
+    delimited = dict(zip(states, mdb._state_delimited))
+
+    return (positions, by_position, delimited, mdb._included_states)
+
+class ExtendSourceTests(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.parts = [''.join(rng.choice('abcd e\n') for ii in range(0, 300)) for jj in range(0, 4)]
+
+    def assertExtendMatches(self, db_class, **kwargs):
+        combined = db_class('combined', ''.join(self.parts), **kwargs)
+        combined.generate()
+
+        extended = db_class('extended', self.parts[0], **kwargs)
+        extended.generate()
+        for part in self.parts[1:]:
+            extended.extend_source(part)
+
+        self.assertEqual(canonical(extended), canonical(combined))
+
+    def test_markov(self):
+        self.assertExtendMatches(MarkovDB, min_state_length=1, max_state_length=3)
+
+    def test_markov_delimited(self):
+        self.assertExtendMatches(MarkovDB, min_state_length=2, max_state_length=4,
+                                 delimiter='\n')
+
+    def test_encoded(self):
+        self.assertExtendMatches(EncodedMarkovDB, min_state_length=1, max_state_length=3)
+
+    def test_encoded_new_characters(self):
+        self.parts[2] += 'xyz'
+        self.assertExtendMatches(EncodedMarkovDB, min_state_length=1, max_state_length=3,
+                                 delimiter='\n')
+
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(4)
+        self.parts = [''.join(rng.choice('abcd e') for ii in range(0, 100)) for jj in range(0, 6)]
+
+        self.mdb = MarkovDB('journal', self.parts[0], 1, 3)
+        self.mdb.generate()
+        self.mdb.save(self.temp_dir)
+
+        self.file_path = self.mdb._saved_loc
+        self.journal_path = self.file_path + '.journal'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def load(self):
+        mdb = MarkovDB('journal')
+        mdb.load(self.file_path)
+
+        return mdb
+
+    def extend_and_save(self, mdb, part):
+        mdb.extend_source(part)
+        mdb.save(compact=False)
+
+        return mdb
+
+    def assertLoadsAs(self, mdb):
+        loaded = self.load()
+        self.assertEqual(loaded._source, mdb._source)
+        self.assertEqual(canonical(loaded), canonical(mdb))
+
+        return loaded
+
+    def test_incremental_saves(self):
+        file_size = os.path.getsize(self.file_path)
+        for part in self.parts[1:]:
+            self.extend_and_save(self.mdb, part)
+
+        self.assertEqual(os.path.getsize(self.file_path), file_size)
+        self.assertTrue(os.path.exists(self.journal_path))
+        self.assertLoadsAs(self.mdb)
+
+    def test_compaction(self):
+        self.extend_and_save(self.mdb, self.parts[1])
+        self.mdb.extend_source(self.parts[2])
+        self.mdb.save(compact=True)
+
+        self.assertFalse(os.path.exists(self.journal_path))
+        self.assertLoadsAs(self.mdb)
+
+    def test_torn_record(self):
+        self.extend_and_save(self.mdb, self.parts[1])
+
+        # A crash part-way through the next append leaves half a record.
+        with open(self.journal_path, 'ab') as journal_file:
+            journal_file.write(b'{"source": "' + self.parts[2].encode('utf-8')[:10])
+
+        loaded = self.assertLoadsAs(self.mdb)
+
+        # Appending after the torn record must not run on from it.
+        self.extend_and_save(loaded, self.parts[3])
+        reloaded = self.assertLoadsAs(loaded)
+
+        self.extend_and_save(reloaded, self.parts[4])
+        self.assertLoadsAs(reloaded)
+
+    def test_unterminated_record(self):
+        self.extend_and_save(self.mdb, self.parts[1])
+        with open(self.journal_path, 'rb') as journal_file:
+            data = journal_file.read()
+
+        # A complete record missing only its newline is still torn, and is dropped.
+        self.extend_and_save(self.mdb, self.parts[2])
+        with open(self.journal_path, 'rb') as journal_file:
+            torn = journal_file.read()[:-1]
+
+        with open(self.journal_path, 'wb') as journal_file:
+            journal_file.write(torn)
+
+        loaded = self.load()
+        self.assertEqual(loaded._source, self.parts[0] + self.parts[1])
+
+        self.extend_and_save(loaded, self.parts[3])
+        self.assertLoadsAs(loaded)
+
+        with open(self.journal_path, 'rb') as journal_file:
+            self.assertTrue(journal_file.read().startswith(data))
+
+    def test_stale_journal(self):
+        self.extend_and_save(self.mdb, self.parts[1])
+        with open(self.journal_path, 'rb') as journal_file:
+            stale_journal = journal_file.read()
+
+        # A crash after a compacting save replaces the file, but before it removes the journal.
+        self.mdb.extend_source(self.parts[2])
+        self.mdb.save(compact=True)
+        with open(self.journal_path, 'wb') as journal_file:
+            journal_file.write(stale_journal)
+
+        loaded = self.assertLoadsAs(self.mdb)
+
+        # Updates must start a new journal rather than being appended to the stale one.
+        self.extend_and_save(loaded, self.parts[3])
+        reloaded = self.assertLoadsAs(loaded)
+
+        self.extend_and_save(reloaded, self.parts[4])
+        self.assertLoadsAs(reloaded)
+
+    def test_encoded_journal(self):
+        mdb = EncodedMarkovDB('journal', self.parts[0], 1, 3)
+        mdb.generate()
+        mdb.save(self.temp_dir)
+
+        for part in self.parts[1:3] + ['xyz']:
+            self.extend_and_save(mdb, part)
+
+        loaded = EncodedMarkovDB('journal')
+        loaded.load(self.file_path)
+        self.assertEqual(canonical(loaded), canonical(mdb))
+        self.assertEqual(loaded.get_chain_as_string(1, seed='xyz'), 'xyz')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+Tests for loading Markov database snapshots.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import marshal, os, shutil, tempfile, unittest
+import settings_helper
+from markov_chain import MarkovDB, InvalidMarkovDatabaseFile
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+        # Load by name from the temporary directory rather than the configured save location.
+        self._cache = dict(settings_helper._value_cache)
+        settings_helper._value_cache[(settings_helper.SettingsHelper.settings_loc,
+                                      settings_helper.SettingsHelper.markov_source_loc_key)] = \
+            self.temp_dir
+
+        self.mdb = MarkovDB('snapshot', 'the quick brown fox jumps over the lazy dog', 1, 3)
+        self.mdb.generate()
+        self.mdb.save(self.temp_dir)
+        self.snapshot_path = self.mdb.save_snapshot()
+
+        # Make sure the snapshot is the newest file.
+        mtime = os.path.getmtime(self.mdb._saved_loc.replace('.msnap', '.mjson.gz'))
+        os.utime(self.snapshot_path, (mtime + 10, mtime + 10))
+
+    def tearDown(self):
+        settings_helper._value_cache.clear()
+        settings_helper._value_cache.update(self._cache)
+        shutil.rmtree(self.temp_dir)
+
+    def rewrite_snapshot(self, **changes):
+        with open(self.snapshot_path, 'rb') as snapshot_file:
+            markov_dict = marshal.load(snapshot_file)
+
+        markov_dict.update(changes)
+        mtime = os.path.getmtime(self.snapshot_path)
+        with open(self.snapshot_path, 'wb') as snapshot_file:
+            marshal.dump(markov_dict, snapshot_file)
+
+        os.utime(self.snapshot_path, (mtime, mtime))
+
+    def test_load_newest_snapshot(self):
+        loaded = MarkovDB('snapshot')
+        loaded.load()
+        self.assertEqual(loaded._saved_loc, self.snapshot_path)
+        self.assertEqual(loaded._state_index, self.mdb._state_index)
+        self.assertEqual(loaded._state_positions, self.mdb._state_positions)
+
+    def test_stale_snapshot_falls_back(self):
+        self.rewrite_snapshot(python_version=(1, 5))
+
+        loaded = MarkovDB('snapshot')
+        loaded.load()
+        self.assertTrue(loaded._saved_loc.endswith('.mjson.gz'))
+        self.assertEqual(loaded._state_index, self.mdb._state_index)
+
+    def test_corrupt_snapshot_falls_back(self):
+        with open(self.snapshot_path, 'wb') as snapshot_file:
+            snapshot_file.write(b'\x00not a snapshot')
+
+        loaded = MarkovDB('snapshot')
+        loaded.load()
+        self.assertTrue(loaded._saved_loc.endswith('.mjson.gz'))
+
+    def test_stale_snapshot_explicit_path(self):
+        self.rewrite_snapshot(python_version=(1, 5))
+
+        self.assertRaises(InvalidMarkovDatabaseFile, MarkovDB('snapshot').load,
+                          self.snapshot_path)
+
+    def test_stale_snapshot_only_file(self):
+        self.rewrite_snapshot(python_version=(1, 5))
+        os.remove(self.snapshot_path.replace('.msnap', '.mjson.gz'))
+
+        self.assertRaises(InvalidMarkovDatabaseFile, MarkovDB('snapshot').load)
+
+if __name__ == '__main__':
+    unittest.main()
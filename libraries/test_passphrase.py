@@ -0,0 +1,89 @@
+'''
+Tests for the word-level passphrase database.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import shutil, tempfile, unittest
+from math import log
+from passphrase import PassphraseDB
+
+class PassphraseEntropyTests(unittest.TestCase):
+    def test_uniform_start(self):
+        pdb = PassphraseDB('uniform', 'alpha bravo charlie delta')
+        pdb.generate()
+
+        # Each word has exactly one successor, so only the start contributes.
+        self.assertAlmostEqual(pdb.entropy(1), 2.0)
+        self.assertAlmostEqual(pdb.entropy(4), 2.0)
+
+    def test_start_weighted_by_frequency(self):
+        pdb = PassphraseDB('skewed', 'alpha alpha alpha bravo')
+        pdb.generate()
+
+        # The start is 'alpha' 3/4 of the time, not 1/2.
+        expected = -(0.75*log(0.75, 2) + 0.25*log(0.25, 2))
+        self.assertAlmostEqual(pdb.entropy(1), expected)
+
+    def test_transition_entropy(self):
+        pdb = PassphraseDB('branching', 'alpha bravo alpha charlie')
+        pdb.generate()
+
+        # Half the time the context is 'alpha', which has two equally likely successors.
+        self.assertAlmostEqual(pdb.entropy(2), 1.5 + 0.5)
+
+    def test_shorter_than_order(self):
+        pdb = PassphraseDB('short', 'alpha bravo alpha charlie', order=2)
+        pdb.generate()
+
+        # The four contexts all differ, but only two words can start a one-word passphrase.
+        self.assertAlmostEqual(pdb.entropy(2), 2.0)
+        self.assertAlmostEqual(pdb.entropy(1), 1.5)
+
+class PassphraseGenerationTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = 'the quick brown fox jumps over the lazy dog and the cat'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_words_from_source(self):
+        pdb = PassphraseDB('words', self.source, order=2)
+        pdb.generate()
+
+        words = set(self.source.split())
+        for passphrase in pdb.get_passphrases(100, 5, separator='-'):
+            self.assertEqual(len(passphrase.split('-')), 5)
+            self.assertTrue(set(passphrase.split('-')) <= words)
+
+    def test_circular_source(self):
+        # The end of the source wraps around to its start, so no context is a dead end.
+        pdb = PassphraseDB('circular', 'alpha bravo charlie', order=1)
+        pdb.generate()
+        self.assertEqual(pdb._transitions[pdb._word_ids['charlie']], (pdb._word_ids['alpha'],))
+
+        pdb = PassphraseDB('circular', 'alpha bravo charlie', order=2)
+        pdb.generate()
+
+        ids = pdb._word_ids
+        self.assertEqual(pdb._transitions[(ids['bravo'], ids['charlie'])], (ids['alpha'],))
+        self.assertEqual(pdb._transitions[(ids['charlie'], ids['alpha'])], (ids['bravo'],))
+        self.assertEqual(set(pdb.get_passphrases(100, 4)),
+                         set(['alpha bravo charlie alpha', 'bravo charlie alpha bravo',
+                              'charlie alpha bravo charlie']))
+
+    def test_save_load(self):
+        pdb = PassphraseDB('saved', self.source)
+        pdb.generate()
+        pdb.save(self.temp_dir)
+
+        loaded = PassphraseDB('saved')
+        loaded.load(pdb._saved_loc)
+        self.assertEqual(loaded._transitions, pdb._transitions)
+        self.assertAlmostEqual(loaded.entropy(4), pdb.entropy(4))
+
+if __name__ == '__main__':
+    unittest.main()
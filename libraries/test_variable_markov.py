@@ -0,0 +1,95 @@
+'''
+Tests for the variable-order Markov database.
+
+Run with: python -m unittest discover -s libraries
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import random, shutil, tempfile, unittest
+from math import log
+from markov_chain import InvalidMarkovStateError, InvalidMarkovSourceError
+from variable_markov import VariableOrderMarkovDB
+
+class VariableOrderProbabilityTests(unittest.TestCase):
+    def setUp(self):
+        self.vdb = VariableOrderMarkovDB('variable', 'abracadabra arcade', max_order=3)
+        self.vdb.generate()
+        self.vdb._rng = random.Random(7)
+
+    def test_probabilities_sum_to_one(self):
+        # Seen contexts of each order, and contexts which never occur in the source.
+        for context in ('', 'a', 'br', 'abr', 'rabr', 'dd', ' c', 'eee'):
+            total = sum(self.vdb.probability(symbol, context) for symbol in self.vdb._alphabet)
+            self.assertAlmostEqual(total, 1.0)
+
+    def test_sample_matches_probability(self):
+        for context in ('', 'ab', 'ee'):
+            path = self.vdb._context_path(self.vdb._encode(context))
+            counts = [0]*len(self.vdb._alphabet)
+            for ii in range(0, 20000):
+                counts[self.vdb._sample(path)] += 1
+
+            for code, symbol in enumerate(self.vdb._alphabet):
+                self.assertAlmostEqual(counts[code]/20000.0,
+                                       self.vdb.probability(symbol, context), delta=0.015)
+
+    def test_entropy(self):
+        # The entropy of a sequence is the information in each symbol given the ones before it.
+        sequence = 'cadabr'
+        expected = -sum(log(self.vdb.probability(sequence[ii], sequence[:ii]), 2)
+                        for ii in range(0, len(sequence)))
+
+        self.assertAlmostEqual(self.vdb.entropy(sequence), expected)
+        self.assertAlmostEqual(self.vdb.entropy(sequence), -self.vdb.log_probability(sequence))
+        self.assertAlmostEqual(self.vdb.entropy(''), 0.0)
+
+    def test_invalid_symbol(self):
+        self.assertRaises(InvalidMarkovStateError, self.vdb.probability, 'z')
+        self.assertRaises(InvalidMarkovStateError, self.vdb.entropy, 'abz')
+
+class VariableOrderChainTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = 'the quick brown fox jumps over the lazy dog'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_seeded_chain(self):
+        vdb = VariableOrderMarkovDB('variable', self.source, max_order=2)
+        vdb.generate()
+
+        for ii in range(0, 50):
+            chain = vdb.get_chain_as_string(10, seed='th')
+            self.assertEqual(len(chain), 10)
+            self.assertTrue(chain.startswith('th'))
+            self.assertTrue(set(chain) <= set(self.source))
+
+        self.assertEqual(vdb.get_chain(2, seed='quick'), list('qu'))
+        self.assertRaises(InvalidMarkovStateError, vdb.get_chain, 5, seed='Q')
+
+    def test_save_load(self):
+        vdb = VariableOrderMarkovDB('saved', self.source, max_order=3)
+        vdb.generate()
+        vdb.save(self.temp_dir)
+
+        loaded = VariableOrderMarkovDB('saved')
+        loaded.load(vdb._saved_loc)
+
+        expected = []
+        vdb._root.serialize(expected)
+        trie = []
+        loaded._root.serialize(trie)
+
+        self.assertEqual(trie, expected)
+        self.assertEqual((loaded._alphabet, loaded.max_order), (vdb._alphabet, vdb.max_order))
+        self.assertAlmostEqual(loaded.entropy('the lazy'), vdb.entropy('the lazy'))
+
+    def test_empty_source(self):
+        for source in ('', []):
+            vdb = VariableOrderMarkovDB('empty', source)
+            self.assertRaises(InvalidMarkovSourceError, vdb.generate)
+
+if __name__ == '__main__':
+    unittest.main()
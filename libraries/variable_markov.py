@@ -0,0 +1,486 @@
+'''
+Library for variable-order Markov chain generation
+
+A context trie is built over the symbols preceding each position in the source, and the next symbol
+is drawn from an interpolated (Witten-Bell) mixture of all of the contexts which match the current
+chain, from the longest down to the empty context.
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import json, os, random, zlib
+from bisect import bisect_right
+from math import log
+import input_validation
+from exception_helper import FileExists, RandomnessSourceUndefined
+from settings_helper import get_markov_save_location
+from markov_chain import InvalidMarkovStateError, InvalidMarkovSourceError, \
+                         MarkovDBNotGeneratedError, InvalidMarkovDatabaseFile
+
+_vm_zip = '.vmjson.gz'      # Compressed variable-order Markov JSON.
+
+class VariableOrderMarkovDB:
+    '''
+    A variable-order Markov model with interpolated backoff.
+
+    Each node of the context trie corresponds to a context (the path from the root is the preceding
+    symbols, most recent first) and stores the number of times each symbol followed that context in
+    the source. The probability of a symbol is interpolated from the longest matching context down
+    to the empty context using Witten-Bell weights, so longer contexts are preferred whenever the
+    source supports them:
+
+        P(s|node) = (count(s) + distinct*P(s|parent)) / (total + distinct)
+
+    with a uniform distribution over the alphabet below the root.
+    '''
+
+    __db_version__ = 0.1                        # Include for future compatibility.
+
+    # Methods
+    def __init__(self, name, source=None, max_order=3):
+        '''
+        The constructor for the class.
+
+        @param name The name of the database. This will be used for file saving, so special
+                    characters are not allowed.
+        @type name str
+
+        @param source An ordered list of symbols to be used in the Markov chain.
+        @type source (str, unicode, list, tuple)
+
+        @param max_order The maximum number of preceding symbols used as context.
+        @type max_order int
+
+        @throws TypeError Thrown if an invalid type is passed to one of the arguments.
+        @throws ValueError Thrown if an invalid value is passed to one of the arguments.
+        '''
+        # Validate the inputs
+        input_validation.valid_name(name, throw_error=True)
+
+        if max_order < 0:
+            raise ValueError('max_order must be a non-negative integer.')
+
+        # Basic values
+        self._source = None
+        self._alphabet = []             # Symbol for each symbol id.
+        self._symbol_ids = {}           # Symbol id for each symbol.
+        self._root = None
+        self._valid_source = False
+        self._db_generated = False
+        self._rng = random.SystemRandom()
+        self._saved_loc = None
+
+        # Construct the object
+        self.name = name
+        self.max_order = max_order
+        if source is not None:
+            self._add_source(source)
+
+    def generate(self):
+        '''
+        Generates the context trie from the source.
+
+        @throws InvalidMarkovSourceError Thrown when no valid source is present, or it is empty.
+        '''
+        if not self._valid_source:
+            raise InvalidMarkovSourceError('Valid source must be provided before '+\
+                                           'generating database.')
+
+        # With no symbols there is nothing to draw chains from.
+        if len(self._source) == 0:
+            raise InvalidMarkovSourceError('Source must contain at least one symbol.')
+
+        self._alphabet = []
+        self._symbol_ids = {}
+        for symbol in self._source:
+            if symbol not in self._symbol_ids:
+                self._symbol_ids[symbol] = len(self._alphabet)
+                self._alphabet.append(symbol)
+
+        codes = [self._symbol_ids[symbol] for symbol in self._source]
+
+        self._root = _ContextNode()
+        for ii in range(0, len(codes)):
+            code = codes[ii]
+            node = self._root
+            node.add(code)
+
+            # Walk back through the preceding symbols, one trie level per symbol.
+            for kk in range(1, min(self.max_order, ii)+1):
+                context_code = codes[ii-kk]
+                if context_code not in node.children:
+                    node.children[context_code] = _ContextNode()
+
+                node = node.children[context_code]
+                node.add(code)
+
+        self._root.finalize()
+        self._db_generated = True
+
+    def save(self, save_location=None, overwrite=True):
+        '''
+        Save the model to a compressed file so that it does not need to be generated from the
+        source with each new instance. The trie is stored as a single flat list of integers, see
+        _ContextNode.serialize().
+
+        @param save_location The directory into which the file should be saved. [Default: None]
+        @type save_location str
+
+        @param overwrite Whether to overwrite an existing file. [Default: True]
+        @type overwrite bool
+
+        @throws MarkovDBNotGeneratedError Raised when the model has not been generated.
+        @throws FileExists Raised if overwrite is False and the file already exists.
+        '''
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before saving.')
+
+        if save_location is None:
+            if self._saved_loc is not None and os.path.exists(self._saved_loc):
+                save_location = os.path.dirname(self._saved_loc)
+            else:
+                save_location = get_markov_save_location()
+
+        save_file_path = os.path.join(save_location, self.name+_vm_zip)
+        if not overwrite and os.path.exists(save_file_path):
+            raise FileExists('Markov database file '+self.name+_vm_zip+' already exists.')
+
+        trie = []
+        self._root.serialize(trie)
+
+        markov_dict = dict()
+        markov_dict['version'] = self.__db_version__
+        markov_dict['name'] = self.name
+        markov_dict['max_order'] = self.max_order
+        markov_dict['alphabet'] = self._alphabet
+        markov_dict['trie'] = trie
+
+        if not os.path.exists(os.path.dirname(save_file_path)):
+            os.makedirs(os.path.dirname(save_file_path))
+
+        with open(save_file_path, 'wb') as save_file:
+            save_file.write(zlib.compress(json.dumps(markov_dict, separators=(',', ':'))))
+
+        self._saved_loc = save_file_path
+
+    def load(self, file_path=None):
+        '''
+        Load a saved model from file.
+
+        @param file_path The path of the file to load. If None, this will be generated from the
+                         default save location and the name passed to the constructor.
+        @type file_path str
+
+        @throws ValueError Raised when an invalid path is passed to file_path
+        @throws InvalidMarkovDatabaseFile Raised when the file is malformed.
+        '''
+        if file_path is None:
+            if self._saved_loc is not None and os.path.exists(self._saved_loc):
+                file_path = self._saved_loc
+            else:
+                file_path = os.path.join(get_markov_save_location(), self.name+_vm_zip)
+
+        input_validation.valid_string_type(file_path, throw_error=True)
+
+        if not os.path.exists(file_path):
+            raise ValueError('Path is not valid.')
+
+        with open(file_path, 'rb') as mdb_file:
+            markov_dict = json.loads(zlib.decompress(mdb_file.read()))
+
+        try:
+            self.name = markov_dict['name']
+            self.max_order = markov_dict['max_order']
+            self._alphabet = markov_dict['alphabet']
+            self._root, _ = _ContextNode.deserialize(markov_dict['trie'], 0)
+        except KeyError as ke:
+            raise InvalidMarkovDatabaseFile('Error reading Markov file key '+ke.args[0], ke=ke)
+        except IndexError:
+            raise InvalidMarkovDatabaseFile('Markov database trie is truncated.')
+
+        self._symbol_ids = dict((symbol, ii) for ii, symbol in enumerate(self._alphabet))
+        self._root.finalize()
+        self._valid_source = False
+        self._db_generated = True
+        self._saved_loc = file_path
+
+    def probability(self, symbol, context=()):
+        '''
+        The interpolated probability that symbol follows context.
+
+        @param symbol The next symbol.
+
+        @param context The preceding symbols, in source order. Only the last max_order symbols are
+                       used.
+        @type context (str, unicode, list, tuple)
+
+        @return Returns the probability as a float.
+
+        @throws InvalidMarkovStateError Thrown if any symbol is not in the alphabet.
+        @throws MarkovDBNotGeneratedError Thrown if the model has not been generated.
+        '''
+        self._check_generated()
+
+        return self._probability(self._symbol_id(symbol), self._context_path(self._encode(context)))
+
+    def log_probability(self, sequence):
+        '''
+        The base-2 log probability of the model producing a sequence from an empty context.
+
+        @param sequence A sequence of symbols.
+        @type sequence (str, unicode, list, tuple)
+
+        @return Returns log2(P(sequence)).
+
+        @throws InvalidMarkovStateError Thrown if any symbol is not in the alphabet.
+        @throws MarkovDBNotGeneratedError Thrown if the model has not been generated.
+        '''
+        self._check_generated()
+
+        codes = self._encode(sequence)
+        log_p = 0.0
+        for ii in range(0, len(codes)):
+            path = self._context_path(codes[max(0, ii-self.max_order):ii])
+            log_p += log(self._probability(codes[ii], path), 2)
+
+        return log_p
+
+    def entropy(self, sequence):
+        '''
+        The information content of a sequence under this model, in bits. For a sequence generated
+        by get_chain() this is the entropy of the choices made to generate it, and so is the
+        appropriate measure of its strength against an attacker who knows the model.
+
+        @param sequence A sequence of symbols.
+        @type sequence (str, unicode, list, tuple)
+
+        @return Returns -log2(P(sequence)).
+        '''
+        return -self.log_probability(sequence)
+
+    def get_chain(self, num_states, seed=None):
+        '''
+        Generate a Markov chain with length num_states. Each symbol is drawn by walking the trie
+        from the longest matching context towards the root, so each costs O(max_order).
+
+        @param num_states Number of symbols to be included in the chain.
+        @type int
+
+        @param seed Symbols with which to start the chain. If None, the chain starts from an empty
+                    context.
+        @type seed (str, unicode, list, tuple)
+
+        @return Returns a list of symbols.
+
+        @throws ValueError Thrown if num_states is not a positive integer.
+        @throws InvalidMarkovStateError Thrown if seed contains a symbol not in the alphabet.
+        @throws MarkovDBNotGeneratedError Thrown if the model has not been generated.
+        '''
+        if num_states < 1:
+            raise ValueError('Number of states must be a positive integer.')
+
+        self._check_generated()
+
+        if self._rng is None:
+            raise RandomnessSourceUndefined('Randomness source needed for Markov chain '+\
+                                            'generation.')
+
+        codes = self._encode(seed) if seed is not None else []
+        while len(codes) < num_states:
+            codes.append(self._sample(self._context_path(codes[-self.max_order:] \
+                                                           if self.max_order > 0 else [])))
+
+        alphabet = self._alphabet
+        return [alphabet[code] for code in codes[:num_states]]
+
+    def get_chain_as_string(self, num_states, seed=None, dedup_filter=None, blocklist=None):
+        '''
+        Call the get_chain method, then concatenate it to a string. This will only work if the
+        source material is also made of strings.
+
+        @param num_states Number of symbols to be included in the chain.
+        @type int
+
+        @param seed Symbols with which to start the chain.
+        @type seed (str, unicode, list, tuple)
+
+        @param dedup_filter If specified, chains already in this filter are regenerated, and the
+                            returned chain is added to it. [Default: None]
+        @type dedup_filter bloom_filter.BloomFilter
+
+        @param blocklist If specified, chains in this blocklist are rejected and regenerated.
+                         [Default: None]
+        @type blocklist blocklist.Blocklist
+
+        @return Returns a chain of symbols as a string.
+
+        @throws TypeError Thrown if the source is not made up of strings or characters.
+        @throws DuplicateLimitError Thrown if no unique chain could be generated.
+        @throws BlocklistLimitError Thrown if no chain outside the blocklist could be generated.
+        '''
+        if blocklist is not None or dedup_filter is not None:
+            generate = lambda: self.get_chain_as_string(num_states, seed=seed)
+            if blocklist is not None:
+                return blocklist.allowed(generate, dedup_filter=dedup_filter)
+
+            return dedup_filter.unique(generate)
+
+        chain = self.get_chain(num_states=num_states, seed=seed)
+        for symbol in chain:
+            input_validation.valid_string_type(symbol, throw_error=True)
+
+        return ''.join(chain)
+
+    # Private methods
+    def _add_source(self, source):
+        '''
+        Adds a source.
+
+        @param source A valid ordered list of some type.
+        @type source (str, unicode, list, tuple)
+        '''
+        if not isinstance(source, (str, unicode, list, tuple)):
+            raise TypeError('Source must be an ordered list or string, given '+\
+                            type(source).__name__)
+
+        self._source = source
+        self._valid_source = True
+
+    def _check_generated(self):
+        '''
+        Raise an error if the model has not been generated.
+        '''
+        if not self._db_generated:
+            raise MarkovDBNotGeneratedError('Markov database must be generated before a chain ' + \
+                                            'can be generated.')
+
+    def _symbol_id(self, symbol):
+        '''
+        Look up the id of a symbol, raising InvalidMarkovStateError if it is not in the alphabet.
+        '''
+        try:
+            return self._symbol_ids[symbol]
+        except (KeyError, TypeError):
+            raise InvalidMarkovStateError(repr(symbol) + ' is not a valid symbol.')
+
+    def _encode(self, sequence):
+        '''
+        Convert a sequence of symbols to a list of symbol ids.
+        '''
+        return [self._symbol_id(symbol) for symbol in sequence]
+
+    def _context_path(self, context_codes):
+        '''
+        Walk the trie along the context, most recent symbol first.
+
+        @param context_codes The preceding symbol ids, in source order.
+
+        @return Returns the list of matching nodes, from the root to the longest matching context.
+        '''
+        node = self._root
+        path = [node]
+        for code in reversed(context_codes):
+            node = node.children.get(code, None)
+            if node is None:
+                break
+
+            path.append(node)
+
+        return path
+
+    def _probability(self, code, path):
+        '''
+        Interpolated probability of a symbol id given a context path from _context_path().
+        '''
+        p = 1.0/len(self._alphabet)
+        for node in path:
+            distinct = len(node.counts)
+            p = (node.counts.get(code, 0) + distinct*p)/float(node.total + distinct)
+
+        return p
+
+    def _sample(self, path):
+        '''
+        Draw a symbol id from the interpolated distribution defined by a context path. Starting at
+        the longest context, the node's own counts are used with probability total/(total+distinct),
+        otherwise we back off to the next shorter context.
+        '''
+        rng = self._rng
+        for node in reversed(path):
+            if rng.random()*(node.total + len(node.counts)) < node.total:
+                ii = bisect_right(node.cumulative, rng.random()*node.total)
+                return node.symbols[ii]
+
+        return rng.randrange(len(self._alphabet))
+
+class _ContextNode(object):
+    '''
+    A single node of the context trie.
+    '''
+    __slots__ = ('children', 'counts', 'total', 'symbols', 'cumulative')
+
+    def __init__(self):
+        self.children = {}              # Node for each preceding symbol id.
+        self.counts = {}                # Number of occurances of each following symbol id.
+        self.total = 0
+        self.symbols = None
+        self.cumulative = None
+
+    def add(self, code):
+        '''
+        Record an occurance of the symbol id following this context.
+        '''
+        self.counts[code] = self.counts.get(code, 0) + 1
+        self.total += 1
+
+    def finalize(self):
+        '''
+        Build the cumulative count tables used for sampling, for this node and all its children.
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.symbols = sorted(node.counts.keys())
+            node.cumulative = []
+            c_total = 0
+            for code in node.symbols:
+                c_total += node.counts[code]
+                node.cumulative.append(c_total)
+
+            stack.extend(node.children.values())
+
+    def serialize(self, out):
+        '''
+        Append the compact form of this subtree to a flat list of integers:
+            num_counts, (symbol, count) * num_counts, num_children, (symbol, child) * num_children
+        '''
+        out.append(len(self.counts))
+        for code in sorted(self.counts.keys()):
+            out.append(code)
+            out.append(self.counts[code])
+
+        out.append(len(self.children))
+        for code in sorted(self.children.keys()):
+            out.append(code)
+            self.children[code].serialize(out)
+
+    @classmethod
+    def deserialize(cls, data, pos):
+        '''
+        Read a subtree from the flat form written by serialize().
+
+        @return Returns (node, next_position)
+        '''
+        node = cls()
+        num_counts = data[pos]; pos += 1
+        for ii in range(0, num_counts):
+            node.counts[data[pos]] = data[pos+1]
+            node.total += data[pos+1]
+            pos += 2
+
+        num_children = data[pos]; pos += 1
+        for ii in range(0, num_children):
+            code = data[pos]
+            node.children[code], pos = cls.deserialize(data, pos+1)
+
+        return node, pos
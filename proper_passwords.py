@@ -0,0 +1,711 @@
+'''
+Command line interface for building Markov databases and bulk-generating passwords from them.
+
+    python proper_passwords.py build NAME SOURCE_FILE [--model markov|variable|passphrase] ...
+    python proper_passwords.py info MODEL
+    python proper_passwords.py generate MODEL --count N --states N [--workers N] [--format text]
+    python proper_passwords.py blocklist WORDLIST OUTPUT
+    python proper_passwords.py snapshot MODEL
+    python proper_passwords.py timing MODEL
+
+MODEL is either the path to a saved database file or the name of a database in the default
+save location (see --model).
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import argparse, io, os, sys
+from time import time
+
+# The libraries are imported when they are first needed, so that each command only pays for the
+# imports it uses. See the timing command.
+
+_model_types = ('markov', 'variable', 'passphrase')
+_output_formats = ('text', 'jsonl', 'csv')
+_write_buffer_size = 1024*1024
+_read_block_size = 1024*1024        # Characters of source read at a time by build --external.
+_chunks_in_flight = 2               # Per worker.
+_min_round_size = 1000              # Passwords requested after the first round of a run.
+_default_dedup_capacity = 10**7     # For filters kept across runs with --dedup-file.
+_default_dedup_error_rate = 0.001
+
+# Worker state, set up once per process by _init_worker()
+_worker_model = None
+
+def main(argv=None):
+    '''
+    Entry point for the command line interface.
+
+    @param argv The command line arguments, not including the program name. If None, sys.argv is
+                used. [Default: None]
+    @type argv list
+
+    @return Returns the exit status. Invalid arguments are reported by the parser, which exits
+            with status 2.
+    '''
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        return args.func(args)
+    except InvalidArgumentError as e:
+        parser.error(str(e))
+
+def build_command(args):
+    '''
+    Build a database from a source file and save it.
+    '''
+    model_class = _get_model_class(args.model)
+    if args.model == 'markov':
+        db = model_class(args.name,
+                         min_state_length=args.min_state_length,
+                         max_state_length=args.max_state_length,
+                         delimiter=args.delimiter or None)
+        with io.open(args.source_file, 'r', encoding=args.encoding) as source_file:
+            if args.external:
+                # Read in blocks, so that the source is never held in memory as a whole.
+                db.build_external(save_location=args.save_location,
+                                  memory_limit=args.memory_limit,
+                                  temp_dir=args.temp_dir,
+                                  source=iter(lambda: source_file.read(_read_block_size), u''))
+            else:
+                db.extend_source(source_file.read())
+
+        if not args.external:
+            db.generate()
+            db.save(save_location=args.save_location, compress=not args.no_compress)
+        elif args.snapshot:
+            # The snapshot is taken of the built database, which is only on disk.
+            db.load(db._saved_loc)
+    else:
+        with io.open(args.source_file, 'r', encoding=args.encoding) as source_file:
+            source = source_file.read()
+
+        if args.model == 'variable':
+            db = model_class(args.name, source=source,
+                             max_order=args.order if args.order is not None else 3)
+        else:
+            db = model_class(args.name, source=source,
+                             order=args.order if args.order is not None else 1)
+
+        db.generate()
+        db.save(save_location=args.save_location)
+
+    sys.stderr.write('Saved '+args.model+' database to '+db._saved_loc+'\n')
+
+    if args.snapshot:
+        _write_snapshot(args.model, db)
+
+    return 0
+
+def info_command(args):
+    '''
+    Print information about a saved database.
+    '''
+    model_type, db = _load_model(args.model_file, args.model)
+
+    info = [('name', db.name), ('model', model_type), ('file', db._saved_loc),
+            ('file size', os.path.getsize(db._saved_loc))]
+
+    if model_type == 'markov':
+        info += [('source length', len(db._source)),
+                 ('states', len(db._state_index)),
+                 ('included states', db._included_states)]
+    elif model_type == 'variable':
+        info += [('max order', db.max_order),
+                 ('alphabet size', len(db._alphabet))]
+    else:
+        info += [('order', db.order),
+                 ('words', len(db._words)),
+                 ('source length', len(db._codes))]
+
+    for key, value in info:
+        sys.stdout.write('{:<16}{}\n'.format(key+':', value))
+
+    return 0
+
+def generate_command(args):
+    '''
+    Bulk-generate passwords, splitting the work across worker processes and streaming the results
+    to the output with buffered writes.
+    '''
+    if args.count < 0:
+        raise InvalidArgumentError('--count must be a non-negative integer.')
+
+    if args.workers < 1:
+        raise InvalidArgumentError('--workers must be a positive integer.')
+
+    if args.format == 'text' and _has_line_break(args.separator):
+        raise InvalidArgumentError('--separator cannot contain line breaks with --format text.')
+
+    # The filter is checked first, so that a bad size is reported without loading the model.
+    dedup_filter = _get_dedup_filter(args)
+    model_type, db = _load_model(args.model_file, args.model)
+    options = dict(states=args.states, separator=args.separator,
+                   random_seed_weighted=args.random_seed_weighted)
+
+    stime = time()
+    emitted = 0
+    rejected = 0
+    line_break_rejected = 0
+    pool, blocklist = _start_generators(model_type, db, args.workers, args.blocklist)
+    try:
+        with _open_output(args.output) as out_file:
+            write = _get_writer(out_file, args.format)
+
+            # Duplicates are dropped here rather than in the workers, so that the filter covers
+            # the whole run. Passwords with line breaks (e.g. from chains that cross lines of the
+            # source) can't be written one per line, so they are dropped from text output too.
+            # The first round asks for exactly the number needed, and later rounds for at least
+            # _min_round_size. Only a round that large with nothing new in it means the model
+            # really is exhausted.
+            requested = args.count
+            while emitted < args.count:
+                round_emitted = 0
+                chunks = _generate_chunks(model_type, db, options, requested, args.workers,
+                                          args.chunk_size, pool=pool, blocklist=blocklist)
+                for chunk, chunk_rejected in chunks:
+                    rejected += chunk_rejected
+                    for password in chunk:
+                        if args.format == 'text' and _has_line_break(password):
+                            line_break_rejected += 1
+                            continue
+
+                        if dedup_filter is not None and dedup_filter.add(password):
+                            continue
+
+                        write(password)
+                        round_emitted += 1
+                        if emitted + round_emitted == args.count:
+                            break
+
+                    if emitted + round_emitted == args.count:
+                        break
+
+                chunks.close()
+
+                emitted += round_emitted
+                if round_emitted == 0 and requested >= _min_round_size:
+                    sys.stderr.write('Model exhausted: no new passwords were generated.\n')
+                    break
+
+                requested = max(args.count - emitted, _min_round_size)
+    finally:
+        _stop_generators(pool, blocklist)
+
+    elapsed = time() - stime
+    sys.stderr.write('Generated {} passwords in {:0.3f}s ({:0.0f}/s)\n'.format(
+                     emitted, elapsed, emitted/elapsed if elapsed > 0 else float('inf')))
+
+    if args.blocklist is not None:
+        sys.stderr.write('Rejected {} blocklisted passwords\n'.format(rejected))
+
+    if line_break_rejected:
+        sys.stderr.write('Rejected {} passwords containing line breaks (use --format jsonl or '
+                         'csv to keep them)\n'.format(line_break_rejected))
+
+    if dedup_filter is not None:
+        sys.stderr.write('Rejected {} duplicates ({:0.3%} duplicate rate), filter holds {} '
+                         'items in {} bytes (est. false positive rate {:0.2e})\n'.format(
+                         dedup_filter.duplicates, dedup_filter.duplicate_rate, len(dedup_filter),
+                         dedup_filter.size_bytes, dedup_filter.estimated_error_rate))
+
+        if args.dedup_file is not None:
+            dedup_filter.save(args.dedup_file)
+
+    return 0 if emitted == args.count else 1
+
+def blocklist_command(args):
+    '''
+    Build a blocklist index from a wordlist.
+    '''
+    from libraries.blocklist import build_blocklist
+
+    stime = time()
+    count = build_blocklist(args.wordlist, args.output,
+                            memory_limit=args.memory_limit, temp_dir=args.temp_dir)
+
+    sys.stderr.write('Indexed {} passwords in {:0.3f}s\n'.format(count, time() - stime))
+
+    return 0
+
+def snapshot_command(args):
+    '''
+    Write a fast-loading snapshot of a saved database.
+    '''
+    model_type, db = _load_model(args.model_file, args.model)
+    _write_snapshot(model_type, db)
+
+    return 0
+
+def timing_command(args):
+    '''
+    Measure the cold-start costs of a generation run: importing the model library, loading the
+    database and generating the first password.
+    '''
+    stime = time()
+    model_type, file_path, name = _resolve_model(args.model_file, args.model)
+    model_class = _get_model_class(model_type)
+    import_time = time()
+
+    db = model_class(name)
+    db.load(file_path)
+    load_time = time()
+
+    options = dict(states=args.states, separator=' ', random_seed_weighted=False)
+    _make_chunk(model_type, db, options, 1)
+    first_time = time()
+
+    for key, value in (('import', import_time - stime),
+                       ('load', load_time - import_time),
+                       ('first password', first_time - load_time),
+                       ('total', first_time - stime)):
+        sys.stdout.write('{:<16}{:0.2f} ms\n'.format(key+':', value*1000))
+
+    sys.stdout.write('{:<16}{}\n'.format('file:', db._saved_loc))
+
+    return 0
+
+# Private functions
+def _get_parser():
+    '''
+    Build the argument parser.
+    '''
+    parser = argparse.ArgumentParser(description='Build Markov databases and generate passwords.')
+    subparsers = parser.add_subparsers()
+
+    # build
+    build = subparsers.add_parser('build', help='Build a database from a source file and save it.')
+    build.add_argument('name', help='Name of the database.')
+    build.add_argument('source_file', help='Text file to use as the source.')
+    build.add_argument('--model', choices=_model_types, default='markov',
+                       help='Type of model to build. [Default: markov]')
+    build.add_argument('--encoding', default='utf-8',
+                       help='Encoding of the source file. [Default: utf-8]')
+    build.add_argument('--save-location', default=None,
+                       help='Directory to save the database into. [Default: from settings]')
+    build.add_argument('--min-state-length', type=int, default=1,
+                       help='Minimum state length (markov). [Default: 1]')
+    build.add_argument('--max-state-length', type=int, default=1,
+                       help='Maximum state length (markov). [Default: 1]')
+    build.add_argument('--delimiter', default='\n',
+                       help='State delimiter (markov). Chains end at states containing it, so '+\
+                            'by default they do not cross lines of the source. Pass an empty '+\
+                            'string for no delimiter. [Default: newline]')
+    build.add_argument('--no-compress', action='store_true',
+                       help='Save uncompressed JSON (markov).')
+    build.add_argument('--external', action='store_true',
+                       help='Build on disk, for sources too large for memory (markov).')
+    build.add_argument('--memory-limit', type=int, default=64*1024*1024,
+                       help='Memory ceiling in bytes for --external. [Default: 64 MiB]')
+    build.add_argument('--temp-dir', default=None,
+                       help='Temporary directory for --external. [Default: system default]')
+    build.add_argument('--order', type=int, default=None,
+                       help='Maximum context order (variable) [Default: 3] or words of '+\
+                            'context (passphrase) [Default: 1].')
+    build.add_argument('--snapshot', action='store_true',
+                       help='Also write a fast-loading snapshot (markov).')
+    build.set_defaults(func=build_command)
+
+    # info
+    info = subparsers.add_parser('info', help='Print information about a saved database.')
+    _add_model_arguments(info)
+    info.set_defaults(func=info_command)
+
+    # generate
+    generate = subparsers.add_parser('generate', help='Bulk-generate passwords.')
+    _add_model_arguments(generate)
+    generate.add_argument('--count', '-n', type=int, default=1,
+                          help='Number of passwords to generate. [Default: 1]')
+    generate.add_argument('--states', '-s', type=int, default=10,
+                          help='Number of states (or words) in each password. [Default: 10]')
+    generate.add_argument('--workers', '-w', type=int, default=1,
+                          help='Number of worker processes. [Default: 1]')
+    generate.add_argument('--format', '-f', choices=_output_formats, default='text',
+                          help='Output format. [Default: text]')
+    generate.add_argument('--output', '-o', default=None,
+                          help='Output file. [Default: stdout]')
+    generate.add_argument('--separator', default=' ',
+                          help='Word separator (passphrase). [Default: space]')
+    generate.add_argument('--random-seed-weighted', action='store_true',
+                          help='Weight the initial state by its frequency (markov).')
+    generate.add_argument('--chunk-size', type=int, default=10000,
+                          help='Passwords generated per unit of work. [Default: 10000]')
+    generate.add_argument('--dedup', action='store_true',
+                          help='Suppress duplicate passwords with a Bloom filter.')
+    generate.add_argument('--dedup-error-rate', type=float, default=None,
+                          help='False positive rate of a new duplicate filter. [Default: 0.001]')
+    generate.add_argument('--dedup-capacity', type=int, default=None,
+                          help='Number of passwords a new duplicate filter should hold, across '+\
+                               'all the runs that share its --dedup-file. [Default: --count, '+\
+                               'or 10 million with --dedup-file]')
+    generate.add_argument('--dedup-memory', type=int, default=None,
+                          help='Memory budget of a new duplicate filter in bytes. Without '+\
+                               '--dedup-capacity, the filter is sized to fill it.')
+    generate.add_argument('--dedup-file', default=None,
+                          help='Load the duplicate filter from this file if it exists, and save '+\
+                               'it there afterwards, to suppress duplicates across runs. The '+\
+                               'filter keeps the size it was created with. Implies --dedup.')
+    generate.add_argument('--blocklist', default=None,
+                          help='Blocklist index (see the blocklist command). Passwords in it '+\
+                               'are rejected and regenerated.')
+    generate.set_defaults(func=generate_command)
+
+    # blocklist
+    blocklist = subparsers.add_parser('blocklist',
+                                      help='Build a blocklist index from a wordlist of known '+\
+                                           'passwords, one per line.')
+    blocklist.add_argument('wordlist', help='UTF-8 wordlist, one password per line.')
+    blocklist.add_argument('output', help='Path to write the index to.')
+    blocklist.add_argument('--memory-limit', type=int, default=64*1024*1024,
+                           help='Memory ceiling in bytes for sorting. [Default: 64 MiB]')
+    blocklist.add_argument('--temp-dir', default=None,
+                           help='Temporary directory for sorting. [Default: system default]')
+    blocklist.set_defaults(func=blocklist_command)
+
+    # snapshot
+    snapshot = subparsers.add_parser('snapshot',
+                                     help='Write a fast-loading snapshot of a saved markov '+\
+                                          'database. Snapshots are specific to the version of '+\
+                                          'Python that wrote them.')
+    _add_model_arguments(snapshot)
+    snapshot.set_defaults(func=snapshot_command)
+
+    # timing
+    timing = subparsers.add_parser('timing',
+                                   help='Report import, load and time-to-first-password.')
+    _add_model_arguments(timing)
+    timing.add_argument('--states', '-s', type=int, default=10,
+                        help='Number of states (or words) in the password. [Default: 10]')
+    timing.set_defaults(func=timing_command)
+
+    return parser
+
+def _add_model_arguments(parser):
+    '''
+    Add the arguments used to locate a saved database.
+    '''
+    parser.add_argument('model_file', metavar='MODEL',
+                        help='Path to a saved database, or the name of one in the default '+\
+                             'save location.')
+    parser.add_argument('--model', choices=_model_types, default=None,
+                        help='Type of model, if MODEL is a name. [Default: markov]')
+
+def _get_model_class(model_type):
+    '''
+    Import and return the database class for a model type.
+    '''
+    if model_type == 'markov':
+        # Sources read from files are always strings, so use the integer-encoded database.
+        from libraries.markov_encoded import EncodedMarkovDB
+        return EncodedMarkovDB
+    elif model_type == 'variable':
+        from libraries.variable_markov import VariableOrderMarkovDB
+        return VariableOrderMarkovDB
+    else:
+        from libraries.passphrase import PassphraseDB
+        return PassphraseDB
+
+def _get_model_extensions(model_type):
+    '''
+    Import and return the saved file extensions for a model type.
+    '''
+    if model_type == 'markov':
+        from libraries.markov_chain import _markov_ext, _m_zip, _m_stream, _m_snap
+        return (_m_zip, _markov_ext, _m_stream, _m_snap)
+    elif model_type == 'variable':
+        from libraries.variable_markov import _vm_zip
+        return (_vm_zip,)
+    else:
+        from libraries.passphrase import _p_zip
+        return (_p_zip,)
+
+def _resolve_model(model_file, model_type=None):
+    '''
+    Work out the type, file path and name of a saved database.
+
+    @param model_file A path to a saved database or the name of a database in the default save
+                      location.
+    @type model_file str
+
+    @param model_type The type of model. If None, this is determined from the file extension, or
+                      is 'markov' for names.
+    @type model_type str
+
+    @return Returns (model_type, file_path, name). file_path is None for names.
+
+    @throws InvalidArgumentError Raised if the type of a file can't be determined.
+    '''
+    if not os.path.isfile(model_file):
+        return (model_type or 'markov', None, model_file)
+
+    # Only import the libraries needed to recognize the extension.
+    base_name = os.path.basename(model_file)
+    for c_type in ((model_type,) if model_type is not None else _model_types):
+        for ext in _get_model_extensions(c_type):
+            if base_name.endswith(ext):
+                return (c_type, model_file, base_name[:-len(ext)])
+
+    if model_type is None:
+        raise InvalidArgumentError('Cannot determine the model type of '+model_file+', use --model.')
+
+    return (model_type, model_file, os.path.splitext(base_name)[0])
+
+def _load_model(model_file, model_type=None):
+    '''
+    Load a saved database from a path or a name.
+
+    @param model_file A path to a saved database or the name of a database in the default save
+                      location.
+    @type model_file str
+
+    @param model_type The type of model. If None, this is determined from the file extension, or
+                      is 'markov' for names.
+    @type model_type str
+
+    @return Returns (model_type, database)
+    '''
+    model_type, file_path, name = _resolve_model(model_file, model_type)
+
+    db = _get_model_class(model_type)(name)
+    db.load(file_path)
+
+    return model_type, db
+
+def _write_snapshot(model_type, db):
+    '''
+    Write a snapshot of a database next to its saved file.
+    '''
+    if model_type != 'markov':
+        raise InvalidArgumentError('Snapshots are only supported for markov databases.')
+
+    snapshot_path = db.save_snapshot()
+    sys.stderr.write('Saved snapshot to '+snapshot_path+'\n')
+
+def _get_dedup_filter(args):
+    '''
+    Create or resume the duplicate filter, if one was requested. New filters are sized from
+    --dedup-capacity or --dedup-memory. A resumed filter keeps its size, so the run fails if it
+    would take the filter past its capacity.
+
+    @return Returns a BloomFilter, or None.
+
+    @throws InvalidArgumentError Raised if the filter can't hold the passwords requested.
+    '''
+    if not args.dedup and args.dedup_file is None:
+        return None
+
+    from libraries.bloom_filter import BloomFilter
+    if args.dedup_file is not None and os.path.exists(args.dedup_file):
+        dedup_filter = BloomFilter.load(args.dedup_file)
+
+        for option, value in (('--dedup-error-rate', args.dedup_error_rate),
+                              ('--dedup-capacity', args.dedup_capacity),
+                              ('--dedup-memory', args.dedup_memory)):
+            if value is not None:
+                sys.stderr.write('Ignoring '+option+', '+args.dedup_file+' keeps the '+\
+                                 'settings it was created with.\n')
+
+        # Past its capacity the filter saturates, and duplicates are mostly false positives.
+        if len(dedup_filter) + args.count > dedup_filter.capacity:
+            raise InvalidArgumentError('Duplicate filter '+args.dedup_file+' holds {} of its capacity '
+                             'of {}, so it cannot take {} more passwords. Start a new filter '
+                             'with a larger --dedup-capacity.'.format(
+                             len(dedup_filter), dedup_filter.capacity, args.count))
+
+        return dedup_filter
+
+    capacity = args.dedup_capacity
+    if capacity is None and args.dedup_memory is None:
+        capacity = _default_dedup_capacity if args.dedup_file is not None else args.count
+
+    try:
+        dedup_filter = BloomFilter(capacity=max(1, capacity) if capacity is not None else None,
+                                   error_rate=args.dedup_error_rate if args.dedup_error_rate \
+                                              is not None else _default_dedup_error_rate,
+                                   max_bytes=args.dedup_memory)
+    except ValueError as e:
+        raise InvalidArgumentError('Invalid duplicate filter settings: '+str(e))
+
+    if dedup_filter.capacity < args.count:
+        raise InvalidArgumentError('The duplicate filter would only hold {} passwords, increase '
+                         '--dedup-capacity or --dedup-memory.'.format(dedup_filter.capacity))
+
+    return dedup_filter
+
+def _init_worker(model_type, file_path, blocklist_path):
+    '''
+    Load the database and open the blocklist once in each worker process. The blocklist is
+    memory-mapped, so its pages are shared between the workers.
+    '''
+    global _worker_model
+    model_type, db = _load_model(file_path, model_type)
+    blocklist = _open_blocklist(blocklist_path)
+
+    _worker_model = (model_type, db, blocklist)
+
+def _worker_chunk(task):
+    '''
+    Generate a chunk of passwords in a worker process.
+    '''
+    options, count = task
+    model_type, db, blocklist = _worker_model
+
+    return _make_chunk(model_type, db, options, count, blocklist)
+
+def _make_chunk(model_type, db, options, count, blocklist=None):
+    '''
+    Generate a list of passwords.
+
+    @param model_type The type of the database.
+    @param db The database.
+    @param options Dictionary of generation options.
+    @param count The number of passwords to generate.
+    @param blocklist If not None, the Blocklist to reject passwords from.
+
+    @return Returns (passwords, number of candidates rejected by the blocklist)
+    '''
+    rejected = blocklist.rejected if blocklist is not None else 0
+
+    states = options['states']
+    if model_type == 'markov':
+        weighted = options['random_seed_weighted']
+        passwords = [db.get_chain_as_string(states, random_seed_weighted=weighted,
+                                            blocklist=blocklist)
+                     for ii in range(0, count)]
+    elif model_type == 'variable':
+        passwords = [db.get_chain_as_string(states, blocklist=blocklist) for ii in range(0, count)]
+    else:
+        passwords = list(db.get_passphrases(count, states, separator=options['separator'],
+                                            blocklist=blocklist))
+
+    if blocklist is not None:
+        rejected = blocklist.rejected - rejected
+
+    return passwords, rejected
+
+def _start_generators(model_type, db, workers, blocklist_path=None):
+    '''
+    Set up password generation for a run: the blocklist, and a pool of worker processes if workers
+    is more than 1. These are reused for every round of the run, and released with
+    _stop_generators(). The blocklist is opened here even when the workers open their own, so
+    that an invalid one raises an error instead of failing in every worker.
+
+    @return Returns (pool, blocklist), either of which may be None.
+    '''
+    blocklist = _open_blocklist(blocklist_path)
+    if workers == 1:
+        return None, blocklist
+
+    import multiprocessing
+    pool = multiprocessing.Pool(workers, initializer=_init_worker,
+                                initargs=(model_type, db._saved_loc, blocklist_path))
+
+    return pool, blocklist
+
+def _stop_generators(pool, blocklist):
+    '''
+    Release the pool and blocklist from _start_generators(). Chunks still in flight from a round
+    that stopped early are discarded.
+    '''
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+    if blocklist is not None:
+        blocklist.close()
+
+def _generate_chunks(model_type, db, options, count, workers, chunk_size, pool=None,
+                     blocklist=None):
+    '''
+    Generate count passwords in chunks, across a pool of worker processes if one is given or
+    otherwise in this process. Chunks from the pool are yielded in the order they were submitted.
+
+    @return Yields (passwords, number rejected by the blocklist) for each chunk.
+    '''
+    chunk_size = max(1, chunk_size)
+    tasks = ((options, min(chunk_size, count - ii)) for ii in range(0, count, chunk_size))
+
+    if pool is None:
+        for task_options, task_count in tasks:
+            yield _make_chunk(model_type, db, task_options, task_count, blocklist)
+
+        return
+
+    from collections import deque
+    from itertools import islice
+
+    # Only keep a window of chunks in flight, so that a slow consumer (e.g. a pipe) holds back
+    # the workers rather than finished chunks piling up in memory. The next task is submitted
+    # before each chunk is yielded, so the workers stay busy while it is written out.
+    pending = deque(pool.apply_async(_worker_chunk, (task,))
+                    for task in islice(tasks, _chunks_in_flight*workers))
+    while pending:
+        chunk = pending.popleft().get()
+        for task in islice(tasks, 1):
+            pending.append(pool.apply_async(_worker_chunk, (task,)))
+
+        yield chunk
+
+def _open_blocklist(blocklist_path):
+    '''
+    Open a blocklist index, if one was given.
+
+    @return Returns a Blocklist, or None.
+    '''
+    if blocklist_path is None:
+        return None
+
+    from libraries.blocklist import Blocklist
+    return Blocklist(blocklist_path)
+
+def _has_line_break(password):
+    '''
+    Whether a password contains a line break, and so can't be written as a line of text.
+    '''
+    return '\n' in password or '\r' in password
+
+def _open_output(output):
+    '''
+    Open the output as a buffered binary stream.
+
+    @param output The path of the output file, or None for stdout.
+    '''
+    if output is None:
+        return io.open(os.dup(sys.stdout.fileno()), 'wb', buffering=_write_buffer_size)
+
+    return io.open(output, 'wb', buffering=_write_buffer_size)
+
+def _get_writer(out_file, output_format):
+    '''
+    Get a function that writes a single password to the output in the given format.
+    '''
+    def encode(password):
+        return password.encode('utf-8') if not isinstance(password, bytes) else password
+
+    if output_format == 'text':
+        def write(password):
+            out_file.write(encode(password) + b'\n')
+    elif output_format == 'jsonl':
+        import json
+        def write(password):
+            out_file.write(encode(json.dumps(password)) + b'\n')
+    else:
+        def write(password):
+            password = encode(password)
+            if any(c in password for c in (b',', b'"', b'\n', b'\r')):
+                password = b'"' + password.replace(b'"', b'""') + b'"'
+
+            out_file.write(password + b'\r\n')
+
+    return write
+
+# Exceptions
+class InvalidArgumentError(ValueError):
+    '''
+    Raised when command line arguments are invalid in a way the parser can't check by itself.
+    '''
+    pass
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+'''
+Tests for the command line interface.
+
+Run with: python -m unittest test_proper_passwords
+
+@author Paul J. Ganssle
+@since 2014-04
+'''
+import io, json, os, shutil, sys, tempfile, unittest
+import proper_passwords
+
+class CommandLineTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stderr = sys.stderr
+        sys.stderr = io.BytesIO()
+
+        self.source_file = self.path('source.txt')
+        with io.open(self.source_file, 'w', encoding='utf-8') as source_file:
+            source_file.write(u'\n'.join(u'alpha{} bravo charlie delta echo'.format(ii % 7)
+                                         for ii in range(0, 200)))
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def build(self, name, *args):
+        self.assertEqual(proper_passwords.main(['build', name, self.source_file,
+                                                '--save-location', self.temp_dir] + list(args)), 0)
+
+    def assertUsageError(self, argv, message):
+        with self.assertRaises(SystemExit) as cm:
+            proper_passwords.main(argv)
+
+        self.assertEqual(cm.exception.code, 2)
+
+        self.assertTrue(message in sys.stderr.getvalue())
+
+    def test_invalid_arguments(self):
+        self.build('model', '--max-state-length', '2')
+        model_file = self.path('model.mjson.gz')
+
+        self.assertUsageError(['generate', model_file, '--count', '-1'], '--count')
+        self.assertUsageError(['generate', model_file, '--workers', '0'], '--workers')
+        self.assertUsageError(['generate', model_file, '--separator', '\n'], '--separator')
+        self.assertUsageError(['generate', model_file, '--dedup', '--dedup-error-rate', '2'],
+                              'error_rate')
+        self.assertUsageError(['generate', model_file, '--count', '100000', '--dedup',
+                               '--dedup-memory', '100'], 'would only hold')
+
+        unknown = self.path('model.txt')
+        shutil.copy(model_file, unknown)
+        self.assertUsageError(['info', unknown], 'use --model')
+
+    def generate(self, model_file, *args):
+        output = self.path('output.txt')
+        status = proper_passwords.main(['generate', model_file, '--output', output] + list(args))
+        with io.open(output, 'rb') as out_file:
+            return status, out_file.read()
+
+    def test_resolve_model(self):
+        self.build('model', '--max-state-length', '2', '--snapshot')
+        self.build('model', '--external')
+        self.build('model', '--model', 'variable')
+        self.build('model', '--model', 'passphrase')
+
+        for file_name, model_type in (('model.mjson.gz', 'markov'),
+                                      ('model.mjsonl', 'markov'),
+                                      ('model.msnap', 'markov'),
+                                      ('model.vmjson.gz', 'variable'),
+                                      ('model.pjson.gz', 'passphrase')):
+            self.assertEqual(proper_passwords._resolve_model(self.path(file_name)),
+                             (model_type, self.path(file_name), 'model'))
+
+            status, output = self.generate(self.path(file_name), '--count', '5')
+            self.assertEqual((status, len(output.splitlines())), (0, 5))
+
+        # Files without a known extension need the type, and names are looked up later.
+        unknown = self.path('model.db')
+        shutil.copy(self.path('model.vmjson.gz'), unknown)
+        self.assertEqual(proper_passwords._resolve_model(unknown, 'variable'),
+                         ('variable', unknown, 'model'))
+        self.assertEqual(proper_passwords._resolve_model('model'), ('markov', None, 'model'))
+
+    def test_writers(self):
+        passwords = [u'plain', u'comma,separated', u'"quoted"', u'two\nlines', u'caf\u00e9']
+        for output_format in ('text', 'jsonl', 'csv'):
+            out_file = io.BytesIO()
+            write = proper_passwords._get_writer(out_file, output_format)
+            for password in passwords[:3] + ([] if output_format == 'text' else passwords[3:]):
+                write(password)
+
+            lines = out_file.getvalue()
+            if output_format == 'text':
+                self.assertEqual(lines, b'plain\ncomma,separated\n"quoted"\n')
+            elif output_format == 'jsonl':
+                self.assertEqual([json.loads(line) for line in lines.splitlines()], passwords)
+            else:
+                self.assertEqual(lines, b'plain\r\n"comma,separated"\r\n"""quoted"""\r\n'
+                                        b'"two\nlines"\r\n' + u'caf\u00e9'.encode('utf-8') +
+                                        b'\r\n')
+
+    def test_rounds(self):
+        # Each round asks for the passwords still needed, but at least _min_round_size after the
+        # first, so rounds that are mostly duplicates don't trickle.
+        self.build('model', '--max-state-length', '2')
+        requested = []
+        generate_chunks = proper_passwords._generate_chunks
+
+        def record_chunks(model_type, db, options, count, *args, **kwargs):
+            requested.append(count)
+            return generate_chunks(model_type, db, options, count, *args, **kwargs)
+
+        proper_passwords._generate_chunks = record_chunks
+        try:
+            status, output = self.generate(self.path('model.mjson.gz'), '--count', '2000',
+                                           '--states', '6', '--dedup')
+            self.assertEqual(status, 0)
+            self.assertEqual(len(set(output.splitlines())), 2000)
+            self.assertEqual(requested[0], 2000)
+            self.assertTrue(len(requested) > 1)
+            self.assertTrue(all(count >= proper_passwords._min_round_size
+                                for count in requested[1:]))
+
+            # A source with only three distinct chains is exhausted after one full-size round.
+            with io.open(self.source_file, 'w', encoding='utf-8') as source_file:
+                source_file.write(u'abc')
+
+            self.build('small')
+            del requested[:]
+            status, output = self.generate(self.path('small.mjson.gz'), '--count', '10',
+                                           '--states', '2', '--dedup')
+            self.assertEqual(status, 1)
+            self.assertEqual(sorted(output.splitlines()), [b'ab', b'bc', b'c'])
+            self.assertEqual(requested, [10, proper_passwords._min_round_size])
+            self.assertTrue('Model exhausted' in sys.stderr.getvalue())
+        finally:
+            proper_passwords._generate_chunks = generate_chunks
+
+    def test_chunks_in_flight(self):
+        self.build('model', '--max-state-length', '2')
+        model_type, db = proper_passwords._load_model(self.path('model.mjson.gz'))
+        proper_passwords._worker_model = (model_type, db, None)
+
+        test = self
+        class Pool(object):
+            # Runs each task when its result is collected, tracking how many are outstanding.
+            in_flight = 0
+            max_in_flight = 0
+
+            def apply_async(self, func, args):
+                Pool.in_flight += 1
+                Pool.max_in_flight = max(Pool.max_in_flight, Pool.in_flight)
+                return Result(func, args)
+
+        class Result(object):
+            def __init__(self, func, args):
+                self.func, self.args = func, args
+
+            def get(self):
+                Pool.in_flight -= 1
+                return self.func(*self.args)
+
+        options = dict(states=3, separator=' ', random_seed_weighted=False)
+        try:
+            chunks = proper_passwords._generate_chunks(model_type, db, options, 1000, 3, 10,
+                                                       pool=Pool())
+            for chunk, rejected in chunks:
+                # Nothing more is submitted while the consumer holds a chunk.
+                test.assertTrue(Pool.in_flight <= proper_passwords._chunks_in_flight*3)
+
+            self.assertEqual(Pool.max_in_flight, proper_passwords._chunks_in_flight*3)
+            self.assertEqual(Pool.in_flight, 0)
+        finally:
+            proper_passwords._worker_model = None
+
+    def test_dedup_file(self):
+        self.build('model', '--max-state-length', '2')
+        model_file = self.path('model.mjson.gz')
+        dedup_file = self.path('seen.bf')
+
+        outputs = []
+        for args in (['--dedup-capacity', '100'], []):
+            status, output = self.generate(model_file, '--count', '40', '--states', '3',
+                                           '--dedup-file', dedup_file, *args)
+            self.assertEqual(status, 0)
+            outputs.append(set(output.splitlines()))
+
+        # The filter is kept between runs, so the second run only has new passwords.
+        self.assertEqual(len(outputs[0] | outputs[1]), 80)
+
+        # Settings of a resumed filter can't be changed, and it can't be overfilled.
+        self.assertUsageError(['generate', model_file, '--count', '40',
+                               '--dedup-file', dedup_file], 'holds 80 of its capacity of 100')
+        self.assertTrue('Ignoring' not in sys.stderr.getvalue())
+        self.assertUsageError(['generate', model_file, '--count', '40', '--dedup-file',
+                               dedup_file, '--dedup-capacity', '1000'], 'holds 80')
+        self.assertTrue('Ignoring --dedup-capacity' in sys.stderr.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()